@@ -0,0 +1,127 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+import os
+import hashlib
+import itertools
+import threading
+import time
+from dotenv import load_dotenv
+import numpy as np
+
+load_dotenv()
+
+# Semantic cache of RAG answers: a query reuses a cached answer when its embedding is close to
+# a cached query's and retrieval returned the same chunks
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Cosine similarity
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # Seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Entries in least recently used order, keyed by entry ID
+_entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+def scope_for(user_id: Optional[int], system_prompt: str) -> str:
+    """Cache scope for a prompt; personalized prompts are only ever shared by the same user."""
+    digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    return f"user:{user_id}:{digest}" if user_id else f"shared:{digest}"
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def lookup(scope: str, query_vector: np.ndarray, chunk_ids: List[int]) -> Optional[Dict[str, Any]]:
+    """Return the closest live entry for the scope and chunk set within the threshold, or None."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    query_vector = _normalize(query_vector)
+    signature = tuple(chunk_ids)
+    now = time.time()
+    with _lock:
+        best, best_similarity = None, ANSWER_CACHE_THRESHOLD
+        for entry_id, entry in list(_entries.items()):
+            if now - entry["created_at"] > ANSWER_CACHE_TTL:
+                del _entries[entry_id]
+                _counters["expired"] += 1
+                continue
+            if entry["scope"] != scope or entry["chunk_ids"] != signature:
+                continue
+            similarity = float(entry["query_vector"] @ query_vector)
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+
+        if best is None:
+            _counters["misses"] += 1
+            return None
+
+        best["hits"] += 1
+        best["last_hit"] = now
+        _entries.move_to_end(best["id"])
+        _counters["hits"] += 1
+        return {**best, "similarity": best_similarity}
+
+def store(scope: str, query: str, query_vector: np.ndarray, chunk_ids: List[int], document_ids: List[int], answer: str):
+    """Cache an answer, evicting the least recently used entry past the size bound."""
+    if not ANSWER_CACHE_ENABLED:
+        return
+
+    with _lock:
+        entry_id = next(_ids)
+        _entries[entry_id] = {
+            "id": entry_id,
+            "scope": scope,
+            "query": query,
+            "query_vector": _normalize(query_vector),
+            "chunk_ids": tuple(chunk_ids),
+            "document_ids": frozenset(document_ids),
+            "answer": answer,
+            "created_at": time.time(),
+            "hits": 0,
+            "last_hit": None,
+        }
+        _counters["stores"] += 1
+        while len(_entries) > ANSWER_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _counters["evicted"] += 1
+
+def invalidate_documents(document_ids: List[int]) -> int:
+    """Drop entries whose answers were built from any of the documents."""
+    changed = set(document_ids)
+    with _lock:
+        stale = [entry_id for entry_id, entry in _entries.items() if entry["document_ids"] & changed]
+        for entry_id in stale:
+            del _entries[entry_id]
+        _counters["invalidated"] += len(stale)
+    return len(stale)
+
+def clear():
+    """Drop every entry."""
+    with _lock:
+        _counters["invalidated"] += len(_entries)
+        _entries.clear()
+
+def stats(top: int = 10) -> Dict[str, Any]:
+    """Report counters and the most reused entries."""
+    with _lock:
+        lookups = _counters["hits"] + _counters["misses"]
+        popular = sorted(_entries.values(), key=lambda entry: entry["hits"], reverse=True)[:top]
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "threshold": ANSWER_CACHE_THRESHOLD,
+            "entries": len(_entries),
+            "max_entries": ANSWER_CACHE_MAX_ENTRIES,
+            **_counters,
+            "hit_rate": round(_counters["hits"] / lookups, 3) if lookups else None,
+            # Personalized queries stay private, even to admins
+            "top_entries": [{
+                "query": None if entry["scope"].startswith("user:") else entry["query"][:100],
+                "personalized": entry["scope"].startswith("user:"),
+                "hits": entry["hits"],
+                "age_seconds": round(time.time() - entry["created_at"], 1),
+                "last_hit": entry["last_hit"],
+            } for entry in popular],
+        }
@@ -1,8 +1,9 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from datetime import datetime, timedelta
 from typing import Optional
 import os
@@ -10,6 +11,7 @@ from dotenv import load_dotenv
 
 from .database import get_db
 from .models import User
+from . import principal_cache
 
 load_dotenv()
 
@@ -18,19 +20,9 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-# Password functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 # Token functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -43,12 +35,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 # User authentication
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # A token verified recently skips both the signature check and the users lookup
+    cached = principal_cache.lookup(token)
+    if cached is not None:
+        return _cached_user(cached)
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -57,7 +54,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    generation = principal_cache.generation()
+    user = await db.scalar(select(User).where(User.email == email))
     if user is None:
         raise credentials_exception
+    
+    values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+    principal_cache.store(token, user.id, generation, values, token_expires_at=payload.get("exp"))
+    return user
+
+def _cached_user(values: dict) -> User:
+    # A fresh detached instance per request, so requests never share one object
+    user = User(**values)
+    make_transient_to_detached(user)
     return user
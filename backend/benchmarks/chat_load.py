@@ -0,0 +1,130 @@
+"""Chat load test: how many chat turns one worker serves at once.
+
+Against a running server (real model calls):
+
+    python -m backend.benchmarks.chat_load --url http://localhost:8000 --email a@b.c --password ... --concurrency 1 4 8
+
+In-process with a simulated model that takes a fixed time per call, so no API key is needed:
+
+    python -m backend.benchmarks.chat_load --simulate-llm-seconds 0.5 --concurrency 1 4 8
+
+For each concurrency level it sends that many chat turns at once and reports wall time,
+throughput and effective concurrency (sum of request latencies / wall time). A worker that
+blocks its event loop on model calls stays near 1 whatever the number of requests in flight.
+Levels above the database pool (DB_POOL_SIZE + DB_MAX_OVERFLOW connections) queue for a
+connection; ``db_pool_wait`` in /api/admin/metrics shows how long.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any
+
+import httpx
+
+
+def install_simulated_model(seconds: float):
+    """Replace ChatOpenAI with a chat model that sleeps asynchronously instead of calling the API."""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    import langchain_openai
+
+    class SimulatedChatModel(BaseChatModel):
+        model: str = "simulated"
+        model_name: str = "simulated"
+        temperature: float = 0.0
+        # Accepted and ignored, so the shared client registry can construct it like ChatOpenAI
+        http_client: Any = None
+        http_async_client: Any = None
+        request_timeout: Any = None
+        max_retries: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "simulated"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(seconds)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="neutral"))])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(seconds)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="neutral"))])
+
+    langchain_openai.ChatOpenAI = SimulatedChatModel
+
+
+async def authenticate(client: httpx.AsyncClient, email: str, password: str) -> dict:
+    response = await client.post("/api/auth/login", data={"username": email, "password": password})
+    if response.status_code == 401:
+        await client.post("/api/auth/register", json={"email": email, "name": "Load test", "password": password})
+        response = await client.post("/api/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def chat_turn(client: httpx.AsyncClient, headers: dict) -> float:
+    conversation = (await client.post("/api/conversations", json={"title": "load test"}, headers=headers)).json()
+    started = time.perf_counter()
+    response = await client.post(
+        f"/api/conversations/{conversation['id']}/messages",
+        json={"content": "I have been feeling anxious before work lately."},
+        headers=headers,
+        timeout=120,
+    )
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run(client: httpx.AsyncClient, headers: dict, levels):
+    report = []
+    for concurrency in levels:
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*[chat_turn(client, headers) for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+        report.append({
+            "concurrency": concurrency,
+            "wall_seconds": round(wall, 3),
+            "turns_per_second": round(concurrency / wall, 2),
+            "median_latency_seconds": round(statistics.median(latencies), 3),
+            "effective_concurrency": round(sum(latencies) / wall, 2),
+        })
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Base URL of a running server; omit to run the app in-process")
+    parser.add_argument("--email", default=f"load-{uuid.uuid4().hex[:8]}@example.com")
+    parser.add_argument("--password", default="load-test-password")
+    parser.add_argument("--simulate-llm-seconds", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url)
+    else:
+        scratch = tempfile.mkdtemp(prefix="chat-load-")
+        os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'app.db')}"
+        os.environ["VECTOR_DB_PATH"] = os.path.join(scratch, "vector_db")
+        os.environ["WARMUP_MODE"] = "off"
+        os.environ.setdefault("CLASSIFIER_BACKEND", "llm")
+        install_simulated_model(args.simulate_llm_seconds)
+        from backend.main import app, lifespan
+        await lifespan(app).__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+    async with client:
+        headers = await authenticate(client, args.email, args.password)
+        print(json.dumps(await run(client, headers, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,113 @@
+"""Compare the local and LLM message classifiers.
+
+    python -m backend.benchmarks.classifier_eval
+    python -m backend.benchmarks.classifier_eval --from-db 500 --backends local llm
+
+Classifies a labelled sample set (or recent user messages from the database) with each
+backend and reports accuracy against the labels where there are any, agreement between
+backends, and per-message latency. The LLM backend needs OPENAI_API_KEY.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from .. import classifier
+
+# Held-out messages with expected (sentiment, intent); none of them are classifier prototypes
+SAMPLES = [
+    ("I can't sleep and my mind keeps racing about work.", "negative", "sharing_experience"),
+    ("How do I stop feeling so nervous before exams?", "negative", "seeking_advice"),
+    ("Thanks, talking this through really helped me.", "positive", "expressing_gratitude"),
+    ("What are the symptoms of depression?", "neutral", "asking_question"),
+    ("Hey, good evening.", "neutral", "greeting"),
+    ("I've been thinking about ending my life.", "negative", "reporting_crisis"),
+    ("I went for a run this morning and felt amazing.", "positive", "sharing_experience"),
+    ("Everyone at home keeps yelling and I'm so done with it.", "negative", "venting"),
+    ("Can you suggest a routine to wind down before bed?", "neutral", "seeking_advice"),
+    ("Is it normal to feel tired all the time when stressed?", "neutral", "asking_question"),
+    ("I'm really grateful you're here.", "positive", "expressing_gratitude"),
+    ("My therapist said I made progress this month!", "positive", "sharing_experience"),
+    ("I hate how nobody ever listens to me.", "negative", "venting"),
+    ("Hi, I'm new here.", "neutral", "greeting"),
+    ("Sometimes I think about hurting myself.", "negative", "reporting_crisis"),
+    ("What's a good way to handle conflict with my roommate?", "neutral", "seeking_advice"),
+]
+
+
+def load_messages(limit: int):
+    from ..database import SessionLocal
+    from ..models import Message
+    db = SessionLocal()
+    try:
+        rows = db.query(Message.content).filter(Message.sender == "user").order_by(Message.id.desc()).limit(limit).all()
+        return [(row.content, None, None) for row in rows]
+    finally:
+        db.close()
+
+
+async def run_backend(name: str, texts):
+    latencies = []
+    labels = []
+    if name == "local":
+        # Load outside the timing so the report shows steady-state latency
+        classifier.load_local_model()
+        for text in texts:
+            started = time.perf_counter()
+            labels.append(classifier.classify_local([text])[0])
+            latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        classifier.classify_local(texts)
+        batch_seconds = time.perf_counter() - started
+    else:
+        for text in texts:
+            started = time.perf_counter()
+            labels.append(await classifier.classify_llm(text))
+            latencies.append(time.perf_counter() - started)
+        batch_seconds = None
+
+    report = {
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 2),
+        "latency_ms_p95": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+    }
+    if batch_seconds is not None:
+        report["batch_messages_per_second"] = round(len(texts) / batch_seconds, 1)
+    return labels, report
+
+
+def rate(pairs):
+    pairs = list(pairs)
+    return round(sum(a == b for a, b in pairs) / len(pairs), 3) if pairs else None
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["local", "llm"], choices=["local", "llm"])
+    parser.add_argument("--from-db", type=int, default=None, help="Classify this many recent user messages instead of the samples")
+    args = parser.parse_args()
+
+    samples = load_messages(args.from_db) if args.from_db else SAMPLES
+    texts = [text for text, _, _ in samples]
+
+    results = {}
+    report = {"messages": len(texts)}
+    for name in args.backends:
+        labels, timing = await run_backend(name, texts)
+        results[name] = labels
+        if not args.from_db:
+            timing["sentiment_accuracy"] = rate((got[0], want) for got, (_, want, _) in zip(labels, samples))
+            timing["intent_accuracy"] = rate((got[1], want) for got, (_, _, want) in zip(labels, samples))
+        report[name] = timing
+
+    if "local" in results and "llm" in results:
+        report["agreement"] = {
+            "sentiment": rate((a[0], b[0]) for a, b in zip(results["local"], results["llm"])),
+            "intent": rate((a[1], b[1]) for a, b in zip(results["local"], results["llm"])),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""Login storm benchmark: login throughput, and how much a burst of logins slows other requests.
+
+    python -m backend.benchmarks.login_storm --logins 200 --concurrency 32
+    python -m backend.benchmarks.login_storm --inline    # hash on the event loop, for comparison
+
+Runs the app in-process against a throwaway database. A probe client lists conversations
+every few milliseconds, first on an idle server and then while the storm is running, and the
+report compares its latency percentiles. When bcrypt runs on the event loop, every probe
+waits behind the logins queued ahead of it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .chat_load import authenticate
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples) -> dict:
+    return {
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def probe(client: httpx.AsyncClient, headers: dict, stop: asyncio.Event, interval: float):
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/conversations", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def storm(client: httpx.AsyncClient, email: str, password: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/auth/login", data={"username": email, "password": password})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    return latencies, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="Logins in flight at once")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="Seconds between probe requests")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="Probe time on the idle server")
+    parser.add_argument("--inline", action="store_true", help="Hash on the event loop instead of the workers")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="login-storm-")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'app.db')}"
+    os.environ["VECTOR_DB_PATH"] = os.path.join(scratch, "vector_db")
+    os.environ["WARMUP_MODE"] = "off"
+    from backend import passwords
+    from backend.main import app, lifespan
+
+    if args.inline:
+        async def run_inline(name, function, *arguments):
+            return function(*arguments)
+        passwords._run = run_inline
+    else:
+        await asyncio.to_thread(passwords.start_workers)
+
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=300) as client:
+            probe_headers = await authenticate(client, "probe@example.com", "probe-password")
+            await authenticate(client, "storm@example.com", "storm-password")
+
+            stop = asyncio.Event()
+            idle = asyncio.create_task(probe(client, probe_headers, stop, args.probe_interval))
+            await asyncio.sleep(args.idle_seconds)
+            stop.set()
+            idle_latencies = await idle
+
+            stop = asyncio.Event()
+            busy = asyncio.create_task(probe(client, probe_headers, stop, args.probe_interval))
+            login_latencies, wall = await storm(client, "storm@example.com", "storm-password", args.logins, args.concurrency)
+            stop.set()
+            busy_latencies = await busy
+
+    if args.inline:
+        hashing = "event loop"
+    elif passwords.PASSWORD_HASH_WORKERS:
+        hashing = f"process pool ({passwords.PASSWORD_HASH_WORKERS} workers)"
+    else:
+        hashing = "thread pool"
+    print(json.dumps({
+        "hashing": hashing,
+        "bcrypt_rounds": passwords.BCRYPT_ROUNDS,
+        "logins": {
+            "count": args.logins,
+            "concurrency": args.concurrency,
+            "per_second": round(args.logins / wall, 2),
+            "median_latency_ms": round(statistics.median(login_latencies) * 1000, 2),
+        },
+        "probe_idle": summarize(idle_latencies),
+        "probe_during_storm": summarize(busy_latencies),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,146 @@
+"""Statement counts and latency of the user message pattern queries.
+
+    python -m backend.benchmarks.pattern_queries --conversations 1 10 100 500 --messages 10
+
+Seeds a throwaway SQLite database with one user per conversation count, then runs
+``get_user_message_patterns`` (rollups) and ``scan_user_message_patterns`` (messages) for
+each. Reports how many SQL statements each issued and the median latency, and exits
+non-zero if a statement count grows with the number of conversations or the two
+functions disagree, so it can guard CI against N+1 regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..memory import get_user_message_patterns, scan_user_message_patterns, rebuild_rollups
+from ..models import User, Conversation, Message
+
+SENTIMENTS = ["positive", "neutral", "negative"]
+INTENTS = ["asking_question", "seeking_advice", "sharing_experience", "venting", "greeting"]
+
+
+def seed(db, conversations: int, messages: int) -> int:
+    user = User(email=f"bench-{conversations}@example.com", name="Bench", hashed_password="x")
+    db.add(user)
+    db.flush()
+    now = datetime.utcnow()
+    for index in range(conversations):
+        # Spread conversations over 60 days so the 30-day window cuts through them
+        created_at = now - timedelta(days=index % 60, minutes=index)
+        conversation = Conversation(user_id=user.id, title=f"Conversation {index}", created_at=created_at, updated_at=created_at)
+        db.add(conversation)
+        db.flush()
+        db.add_all([
+            Message(
+                conversation_id=conversation.id,
+                content="message",
+                sender="user" if position % 2 == 0 else "ai",
+                sentiment=SENTIMENTS[(index + position) % len(SENTIMENTS)],
+                intent=INTENTS[(index * position) % len(INTENTS)],
+                created_at=created_at + timedelta(minutes=position),
+            )
+            for position in range(messages)
+        ])
+    db.commit()
+    return user.id
+
+
+class StatementLog(list):
+    """Event listener target that records each executed statement."""
+
+    def append_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.append(statement)
+
+
+async def measure(db, engine, function, user_id: int, runs: int):
+    statements = StatementLog()
+    event.listen(engine.sync_engine, "before_cursor_execute", statements.append_statement)
+    try:
+        db.expire_all()
+        result = await function(db, user_id)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", statements.append_statement)
+
+    samples = []
+    for _ in range(runs):
+        db.expire_all()
+        started = time.perf_counter()
+        await function(db, user_id)
+        samples.append(time.perf_counter() - started)
+    return result, len(statements), statistics.median(samples)
+
+
+async def run(args):
+    # Seeding uses a sync session; the measured functions run on the async session the API uses
+    path = os.path.join(tempfile.mkdtemp(prefix="pattern-bench-"), "app.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    with sessionmaker(bind=sync_engine)() as seed_db:
+        users = {count: seed(seed_db, count, args.messages) for count in args.conversations}
+    sync_engine.dispose()
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        await rebuild_rollups(db)
+        report, counts, mismatched = await compare(db, engine, users, args.runs)
+    await engine.dispose()
+    return report, counts, mismatched
+
+
+async def compare(db, engine, users, runs: int):
+    report = {}
+    counts = {"rollups": set(), "scan": set()}
+    mismatched = []
+    for conversations, user_id in users.items():
+        rollup_result, rollup_statements, rollup_seconds = await measure(
+            db, engine, get_user_message_patterns, user_id, runs
+        )
+        scan_result, scan_statements, scan_seconds = await measure(
+            db, engine, scan_user_message_patterns, user_id, runs
+        )
+        counts["rollups"].add(rollup_statements)
+        counts["scan"].add(scan_statements)
+        if rollup_result != scan_result:
+            mismatched.append(conversations)
+        report[conversations] = {
+            "messages": rollup_result["message_count"],
+            "rollups": {"statements": rollup_statements, "ms_p50": round(rollup_seconds * 1000, 2)},
+            "scan": {"statements": scan_statements, "ms_p50": round(scan_seconds * 1000, 2)},
+        }
+    return report, counts, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--messages", type=int, default=10, help="Messages per conversation, half of them from the user")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report, counts, mismatched = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    failed = False
+    for name, seen in counts.items():
+        if len(seen) > 1:
+            print(f"{name} statement count varies with conversation count: {sorted(seen)}", file=sys.stderr)
+            failed = True
+    if mismatched:
+        print(f"rollups and scan disagree for conversation counts {mismatched}", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Startup-time benchmark for the backend.
+
+Each measurement runs in a fresh interpreter so module caches do not hide import costs:
+
+    python -m backend.benchmarks.startup --runs 5 --max-import-seconds 2.0
+
+Reports the median time to import ``backend.models`` and ``backend.main``, and the time
+from application startup until the readiness endpoint reports ready. Exits non-zero when
+a limit is exceeded, so it can guard CI against startup regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+READY_SNIPPET = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+from backend.main import app
+with TestClient(app) as client:
+    while client.get("/api/health/ready").status_code != 200:
+        time.sleep(0.01)
+print(time.perf_counter() - started)
+"""
+
+
+def measure(snippet: str, env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=None, help="Fail if importing backend.main takes longer")
+    parser.add_argument("--max-ready-seconds", type=float, default=None, help="Fail if becoming ready takes longer")
+    args = parser.parse_args()
+
+    # Point the app at throwaway storage so the benchmark never touches real data
+    scratch = tempfile.mkdtemp(prefix="startup-bench-")
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'app.db')}"
+    env["VECTOR_DB_PATH"] = os.path.join(scratch, "vector_db")
+
+    results = {}
+    for module in ("backend.models", "backend.main"):
+        samples = [measure(IMPORT_SNIPPET.format(module=module), env) for _ in range(args.runs)]
+        results[f"import {module}"] = statistics.median(samples)
+    for mode in ("off", "blocking"):
+        samples = [measure(READY_SNIPPET, {**env, "WARMUP_MODE": mode}) for _ in range(args.runs)]
+        results[f"ready (WARMUP_MODE={mode})"] = statistics.median(samples)
+
+    print(json.dumps({name: round(seconds, 3) for name, seconds in results.items()}, indent=2))
+
+    failed = False
+    if args.max_import_seconds is not None and results["import backend.main"] > args.max_import_seconds:
+        print(f"import backend.main exceeded {args.max_import_seconds}s", file=sys.stderr)
+        failed = True
+    if args.max_ready_seconds is not None and results["ready (WARMUP_MODE=blocking)"] > args.max_ready_seconds:
+        print(f"warm-up exceeded {args.max_ready_seconds}s", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
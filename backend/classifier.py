@@ -0,0 +1,234 @@
+from typing import List, Dict, Tuple
+import os
+import re
+import asyncio
+import threading
+from dotenv import load_dotenv
+import numpy as np
+from . import metrics
+
+load_dotenv()
+
+# Classification backend for message sentiment and intent: "local" runs a sentence-transformers
+# model on CPU, "llm" asks the chat model (two extra API calls per message)
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "local")
+CLASSIFIER_MODEL = os.getenv("CLASSIFIER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "32"))
+
+SENTIMENT_LABELS = ["positive", "negative", "neutral"]
+
+# Fixed intent vocabulary stored on messages, whichever backend produced the label
+INTENT_LABELS = [
+    "seeking_advice",
+    "asking_question",
+    "sharing_experience",
+    "venting",
+    "expressing_gratitude",
+    "reporting_crisis",
+    "greeting",
+    "other",
+]
+
+# Free-form LLM answers mapped onto the vocabulary, first matching keyword wins; crisis keywords
+# come first so a label like "crisis_help" is never read as a request for advice
+INTENT_SYNONYMS = {
+    "crisis": "reporting_crisis",
+    "emergency": "reporting_crisis",
+    "self_harm": "reporting_crisis",
+    "suicid": "reporting_crisis",
+    "advice": "seeking_advice",
+    "help": "seeking_advice",
+    "support": "seeking_advice",
+    "guidance": "seeking_advice",
+    "question": "asking_question",
+    "information": "asking_question",
+    "clarification": "asking_question",
+    "sharing": "sharing_experience",
+    "experience": "sharing_experience",
+    "update": "sharing_experience",
+    "vent": "venting",
+    "frustration": "venting",
+    "complain": "venting",
+    "emotion": "venting",
+    "gratitude": "expressing_gratitude",
+    "thank": "expressing_gratitude",
+    "appreciation": "expressing_gratitude",
+    "greeting": "greeting",
+    "hello": "greeting",
+    "introduction": "greeting",
+}
+
+# Messages that must be treated as a crisis regardless of what the classifier says
+CRISIS_PATTERN = re.compile(
+    r"\b(suicid\w*|kill(ing)? myself|end(ing)? my life|self[- ]harm\w*|hurt(ing)? myself|want to die|no reason to live)\b",
+    re.IGNORECASE,
+)
+
+# Example messages per label; the local backend compares new messages against their centroids
+SENTIMENT_EXAMPLES = {
+    "positive": [
+        "I'm feeling much better this week.",
+        "Today was a really good day and I'm proud of myself.",
+        "The breathing exercise actually helped, thank you!",
+        "I finally got a full night of sleep and feel great.",
+        "Things are looking up at work and at home.",
+    ],
+    "negative": [
+        "I feel hopeless and nothing seems to help.",
+        "I've been so anxious I can't concentrate on anything.",
+        "I'm exhausted and everything feels overwhelming.",
+        "I had a panic attack again last night.",
+        "I feel lonely and nobody understands me.",
+    ],
+    "neutral": [
+        "I have a question about the exercises.",
+        "Can you tell me more about cognitive behavioral therapy?",
+        "I went to my appointment on Tuesday.",
+        "What time of day is best for meditation?",
+        "I read the article you mentioned.",
+    ],
+}
+
+INTENT_EXAMPLES = {
+    "seeking_advice": [
+        "What should I do when I feel anxious before meetings?",
+        "How can I stop overthinking at night?",
+        "Do you have any tips for coping with stress?",
+        "I need help dealing with my panic attacks.",
+    ],
+    "asking_question": [
+        "What is the difference between anxiety and stress?",
+        "Is mindfulness the same as meditation?",
+        "How does cognitive behavioral therapy work?",
+        "What does burnout mean?",
+    ],
+    "sharing_experience": [
+        "Yesterday I tried journaling for the first time.",
+        "I talked to my sister about how I've been feeling.",
+        "Last week I went back to the gym after a long break.",
+        "I started a new job and it has been a big change.",
+    ],
+    "venting": [
+        "I'm so tired of everyone expecting so much from me.",
+        "Nothing ever goes right and I'm sick of it.",
+        "My boss keeps ignoring me and it makes me furious.",
+        "I just need to get this off my chest, today was awful.",
+    ],
+    "expressing_gratitude": [
+        "Thank you so much, that really helped.",
+        "I appreciate you listening to me.",
+        "Thanks for the advice, it made a difference.",
+        "I'm grateful for these conversations.",
+    ],
+    "reporting_crisis": [
+        "I don't want to be alive anymore.",
+        "I'm thinking about hurting myself.",
+        "I feel like ending it all tonight.",
+        "I'm not safe right now.",
+    ],
+    "greeting": [
+        "Hi there.",
+        "Hello, how are you?",
+        "Good morning!",
+        "Hey, I'm back.",
+    ],
+    "other": [
+        "Okay.",
+        "Let me check my calendar.",
+        "asdf",
+        "Never mind.",
+    ],
+}
+
+# Local model and label centroids, created on first use
+_local_model = None
+_centroids: Dict[str, Tuple[List[str], np.ndarray]] = {}
+_local_lock = threading.Lock()
+_local_failed = False
+
+def normalize_intent(raw: str) -> str:
+    """Map a free-form intent string onto INTENT_LABELS."""
+    label = re.sub(r"[^a-z_]+", "_", (raw or "").strip().lower()).strip("_")
+    if label in INTENT_LABELS:
+        return label
+    # The label itself may describe a crisis in words the keywords miss, e.g. "wants_to_hurt_myself"
+    if CRISIS_PATTERN.search(label.replace("_", " ")):
+        return "reporting_crisis"
+    for keyword, intent in INTENT_SYNONYMS.items():
+        if keyword in label:
+            return intent
+    return "other"
+
+def _centroid_matrix(model, examples: Dict[str, List[str]]) -> Tuple[List[str], np.ndarray]:
+    labels = list(examples)
+    rows = []
+    for label in labels:
+        vectors = model.encode(examples[label], batch_size=CLASSIFIER_BATCH_SIZE, normalize_embeddings=True)
+        centroid = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+        rows.append(centroid / np.linalg.norm(centroid))
+    return labels, np.vstack(rows)
+
+def load_local_model():
+    """Load the sentence-transformers model and label centroids, once per process."""
+    global _local_model
+    if _local_model is None:
+        with _local_lock:
+            if _local_model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(CLASSIFIER_MODEL, device="cpu")
+                _centroids["sentiment"] = _centroid_matrix(model, SENTIMENT_EXAMPLES)
+                _centroids["intent"] = _centroid_matrix(model, INTENT_EXAMPLES)
+                # Publish the model last so other threads never see it without centroids
+                _local_model = model
+    return _local_model
+
+def classify_local(texts: List[str]) -> List[Tuple[str, str]]:
+    """Classify a batch of texts as (sentiment, intent) with the local model."""
+    if not texts:
+        return []
+
+    model = load_local_model()
+    vectors = np.asarray(
+        model.encode(texts, batch_size=CLASSIFIER_BATCH_SIZE, normalize_embeddings=True), dtype=np.float32
+    )
+    sentiment_labels, sentiment_centroids = _centroids["sentiment"]
+    intent_labels, intent_centroids = _centroids["intent"]
+    sentiments = (vectors @ sentiment_centroids.T).argmax(axis=1)
+    intents = (vectors @ intent_centroids.T).argmax(axis=1)
+
+    results = []
+    for text, s, i in zip(texts, sentiments, intents):
+        intent = intent_labels[i]
+        if CRISIS_PATTERN.search(text):
+            intent = "reporting_crisis"
+        results.append((sentiment_labels[s], intent))
+    return results
+
+async def classify_llm(text: str) -> Tuple[str, str]:
+    """Classify a text as (sentiment, intent) with two concurrent chat model calls."""
+    from .rag import analyze_sentiment, detect_intent
+    sentiment, intent = await asyncio.gather(analyze_sentiment(text), detect_intent(text))
+    if CRISIS_PATTERN.search(text):
+        intent = "reporting_crisis"
+    return sentiment, intent
+
+async def classify_message(text: str) -> Tuple[str, str]:
+    """Classify a user message as (sentiment, intent) with the configured backend."""
+    global _local_failed
+    if CLASSIFIER_BACKEND == "llm" or _local_failed:
+        return await classify_llm(text)
+    try:
+        await asyncio.to_thread(load_local_model)
+    except Exception as e:
+        # A missing or broken local model should not take the chat down; use the LLM from now on
+        _local_failed = True
+        print(f"Local classifier unavailable, falling back to LLM: {str(e)}")
+        return await classify_llm(text)
+    try:
+        results = await asyncio.to_thread(classify_local, [text])
+        return results[0]
+    except Exception as e:
+        # The model loaded, so only this message goes to the LLM
+        metrics.increment("classifier_llm_fallbacks")
+        print(f"Local classification failed, using LLM for this message: {str(e)}")
+        return await classify_llm(text)
@@ -0,0 +1,92 @@
+"""Maintenance commands for the backend.
+
+Run from the repository root, e.g. ``python -m backend.cli migrate-index --type hnsw``.
+"""
+import argparse
+import asyncio
+import json
+
+from . import vector_store
+from . import embeddings
+
+def migrate_index(args):
+    vector_store.initialize_vector_store()
+    print(f"Rebuilding {vector_store.size()} vectors from {vector_store.index_type} to {args.type}...")
+    print(json.dumps(vector_store.migrate(args.type), indent=2))
+
+def eval_index(args):
+    vector_store.initialize_vector_store()
+    for kind in args.type:
+        report = vector_store.evaluate(kind, k=args.k, n_queries=args.queries, nprobe=args.nprobe, ef_search=args.ef_search)
+        print(json.dumps(report, indent=2))
+
+def reembed(args):
+    from .database import SessionLocal
+    from .rag import reembed_corpus
+    backend = embeddings.create_backend(args.backend, args.model)
+    print(f"Re-embedding all chunks with {backend.name} ({backend.dimension} dimensions)...")
+    db = SessionLocal()
+    try:
+        report = reembed_corpus(db, backend, batch_size=args.batch_size)
+    finally:
+        db.close()
+    # The staged index is flat; rebuild it as the configured type when there are enough vectors to train it
+    if vector_store.INDEX_TYPE != "flat" and vector_store.size() >= vector_store.min_training_vectors(vector_store.INDEX_TYPE, vector_store.size()):
+        report["migration"] = vector_store.migrate(vector_store.INDEX_TYPE)
+    print(json.dumps(report, indent=2))
+    print(f"Set EMBEDDING_BACKEND={args.backend} and EMBEDDING_MODEL={backend.model} and restart the server.")
+
+def rebuild_rollups(args):
+    asyncio.run(_rebuild_rollups(args))
+
+async def _rebuild_rollups(args):
+    from sqlalchemy import select
+    from .database import AsyncSessionLocal, async_engine
+    from .models import User
+    from .memory import rebuild_rollups as rebuild, get_user_message_patterns, scan_user_message_patterns
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.check:
+                # Compare rollup-based patterns against a scan of the messages for every user
+                mismatched = []
+                for user_id in (await db.scalars(select(User.id))).all():
+                    for days in (7, 30, 365):
+                        if await get_user_message_patterns(db, user_id, days) != await scan_user_message_patterns(db, user_id, days):
+                            mismatched.append({"user_id": user_id, "days": days})
+                print(json.dumps({"mismatched": mismatched}, indent=2))
+                return
+            print(f"Rebuilt {await rebuild(db)} rollup buckets")
+    finally:
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-index", help="Rebuild the vector index as another index type")
+    migrate.add_argument("--type", required=True, help=f"One of {', '.join(vector_store.INDEX_TYPES)} or a FAISS factory string")
+    migrate.set_defaults(func=migrate_index)
+
+    evaluate = commands.add_parser("eval-index", help="Report recall@k and latency of index types against the flat baseline")
+    evaluate.add_argument("--type", nargs="+", default=["hnsw", "ivf_sq8", "ivf_pq"])
+    evaluate.add_argument("--k", type=int, default=10)
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("--nprobe", type=int, default=None)
+    evaluate.add_argument("--ef-search", type=int, default=None)
+    evaluate.set_defaults(func=eval_index)
+
+    rebuild = commands.add_parser("reembed", help="Re-embed every chunk with another embedding model (resumable)")
+    rebuild.add_argument("--backend", default=embeddings.EMBEDDING_BACKEND, choices=sorted(embeddings.BACKENDS))
+    rebuild.add_argument("--model", default=None, help="Model name; defaults to the backend's default model")
+    rebuild.add_argument("--batch-size", type=int, default=256, help="Chunks embedded per checkpoint")
+    rebuild.set_defaults(func=reembed)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recount per-user message rollups from the messages table")
+    rollups.add_argument("--check", action="store_true", help="Only report users whose rollups disagree with their messages")
+    rollups.set_defaults(func=rebuild_rollups)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
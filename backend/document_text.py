@@ -0,0 +1,258 @@
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+import anyio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Uploaded files are spooled here and read back by the ingestion worker, which must see the same directory
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_READ_BYTES = int(os.getenv("UPLOAD_READ_BYTES", str(1024 * 1024)))  # Bytes read per step when spooling and ingesting
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Encoding of uploads that declare no charset, have no byte order mark and are not valid UTF-8
+UPLOAD_FALLBACK_ENCODING = os.getenv("UPLOAD_FALLBACK_ENCODING", "cp1252")
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Text is split in segments of about this many characters, cut at paragraph, line or word breaks
+SPLIT_SEGMENT_CHARS = int(os.getenv("SPLIT_SEGMENT_CHARS", "262144"))
+# Worker processes that split the segments of large documents; 0 splits in the ingesting thread
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", str(min(4, os.cpu_count() or 1))))
+SPLIT_PARALLEL_MIN_BYTES = int(os.getenv("SPLIT_PARALLEL_MIN_BYTES", str(2 * 1024 * 1024)))
+
+# Longest marks first, since the UTF-32 little-endian mark starts with the UTF-16 one
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+_splitter = None
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+def _known_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def _byte_order_mark_encoding(block: bytes) -> Optional[str]:
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if block.startswith(mark):
+            return encoding
+    return None
+
+def _declared_charset(content_type: Optional[str]) -> Optional[str]:
+    for parameter in (content_type or "").split(";")[1:]:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "charset":
+            return value.strip().strip('"')
+    return None
+
+async def spool_upload(file) -> Tuple[str, str, int]:
+    """Stream an upload to a file under UPLOAD_DIR; returns its path, text encoding and size in bytes.
+
+    The encoding is the charset declared in the upload's content type, else the byte order mark's,
+    else UTF-8 when every byte decodes as UTF-8, else UPLOAD_FALLBACK_ENCODING. Raises ValueError
+    past MAX_UPLOAD_BYTES.
+    """
+    await anyio.Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.upload")
+    encoding = _known_encoding(_declared_charset(file.content_type))
+    validator = None
+    size = 0
+    try:
+        async with await anyio.open_file(path, "wb") as spool:
+            while True:
+                block = await file.read(UPLOAD_READ_BYTES)
+                if not block:
+                    break
+                if size == 0 and encoding is None:
+                    encoding = _byte_order_mark_encoding(block)
+                    if encoding is None:
+                        validator = codecs.getincrementaldecoder("utf-8")()
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise ValueError(f"File is larger than {MAX_UPLOAD_BYTES} bytes")
+                # Check UTF-8 a block at a time, so the whole text is never decoded in memory
+                if validator is not None:
+                    try:
+                        validator.decode(block)
+                    except UnicodeDecodeError:
+                        validator, encoding = None, UPLOAD_FALLBACK_ENCODING
+                await spool.write(block)
+        if validator is not None:
+            try:
+                validator.decode(b"", final=True)
+                encoding = "utf-8"
+            except UnicodeDecodeError:
+                encoding = UPLOAD_FALLBACK_ENCODING
+    except BaseException:
+        remove_upload(path)
+        raise
+    return path, encoding or "utf-8", size
+
+def remove_upload(path: Optional[str]):
+    """Delete a spooled upload, if it still exists."""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def iter_file_text(path: str, encoding: str) -> Iterator[str]:
+    """Decode a file a block at a time; undecodable bytes are replaced."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    with open(path, "rb") as source:
+        while True:
+            block = source.read(UPLOAD_READ_BYTES)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def read_text_preview(path: str, encoding: str, max_bytes: int) -> Tuple[str, bool]:
+    """Decode the first max_bytes of a file; the flag is True when the file is longer."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    with open(path, "rb") as source:
+        block = source.read(max_bytes)
+        truncated = bool(source.read(1))
+    # A multi-byte character cut at the limit is dropped rather than replaced
+    return decoder.decode(block, final=not truncated), truncated
+
+def _cut(text: str) -> int:
+    for separator in ("\n\n", "\n", " "):
+        position = text.rfind(separator, SPLIT_SEGMENT_CHARS // 2, SPLIT_SEGMENT_CHARS)
+        if position != -1:
+            return position + len(separator)
+    return SPLIT_SEGMENT_CHARS
+
+def iter_segments(blocks: Iterable[str]) -> Iterator[str]:
+    """Regroup text blocks into segments that can be split independently."""
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= SPLIT_SEGMENT_CHARS:
+            cut = _cut(buffer)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+def split_segment(text: str) -> List[str]:
+    """Split one segment into overlapping chunks."""
+    global _splitter
+    if _splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        _splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+        )
+    return _splitter.split_text(text)
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawned rather than forked, so workers never inherit the caller's threads or event loop
+            _executor = ProcessPoolExecutor(max_workers=SPLIT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def start_workers():
+    """Start the splitting processes and load the splitter in each, so the first large document does not wait for them."""
+    if SPLIT_WORKERS > 0:
+        list(_get_executor().map(split_segment, [""] * SPLIT_WORKERS))
+
+def shutdown():
+    """Stop the splitting processes."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_chunks(segments: Iterable[str], parallel: bool = False) -> Iterator[str]:
+    """Split segments into chunks, in order; in parallel, a few segments ahead are split across the process pool."""
+    if not parallel or SPLIT_WORKERS <= 0:
+        for segment in segments:
+            yield from split_segment(segment)
+        return
+
+    executor = _get_executor()
+    pending = deque()
+    try:
+        for segment in segments:
+            pending.append(executor.submit(split_segment, segment))
+            if len(pending) >= 2 * SPLIT_WORKERS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group items into lists of up to size."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def prefetch(items: Iterable[Any], depth: int) -> Iterator[Any]:
+    """Produce items in a background thread, at most depth ahead of the consumer."""
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as e:
+            put((False, e))
+        finally:
+            # Release the producer's files and pending splits when the consumer stops early
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=produce, name="prefetch", daemon=True).start()
+    try:
+        while True:
+            more, value = buffer.get()
+            if not more:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        stop.set()
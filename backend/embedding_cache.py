@@ -0,0 +1,179 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+import numpy as np
+
+load_dotenv()
+
+# Content-addressed cache of embeddings keyed by (model, sha256 of the text)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(os.getenv("VECTOR_DB_PATH", "./vector_db"), "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")  # float16 halves disk use
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+
+# Fraction of the size limit the disk store is trimmed down to when it overflows
+EVICTION_TARGET = 0.9
+
+_connection = None
+_memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+def cache_key(model: str, text: str) -> str:
+    """Key for a text embedded by a model."""
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        directory = os.path.dirname(EMBEDDING_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        # Stored size, kept in the database because every process that embeds writes the same file
+        connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        connection.execute(
+            "INSERT OR IGNORE INTO cache_size (id, bytes) SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        )
+        connection.commit()
+        _connection = connection
+    return _connection
+
+def _remember(key: str, vector: np.ndarray):
+    _memory[key] = vector
+    _memory.move_to_end(key)
+    while len(_memory) > EMBEDDING_CACHE_MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+def get_many(model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+    """Look up cached float32 embeddings for texts; None marks a miss."""
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return [None] * len(texts)
+
+    keys = [cache_key(model, text) for text in texts]
+    results: List[Optional[np.ndarray]] = [None] * len(texts)
+    with _lock:
+        missing = {}
+        for position, key in enumerate(keys):
+            vector = _memory.get(key)
+            if vector is not None:
+                _memory.move_to_end(key)
+                results[position] = vector
+                _counters["memory_hits"] += 1
+            else:
+                missing.setdefault(key, []).append(position)
+
+        if missing:
+            connection = _connect()
+            found = {}
+            key_list = list(missing)
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, dtype, blob in connection.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+            if found:
+                now = time.time()
+                connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                connection.commit()
+            for key, positions in missing.items():
+                vector = found.get(key)
+                if vector is None:
+                    _counters["misses"] += len(positions)
+                    continue
+                _remember(key, vector)
+                _counters["disk_hits"] += len(positions)
+                for position in positions:
+                    results[position] = vector
+    return results
+
+def put_many(model: str, texts: List[str], vectors: np.ndarray):
+    """Store embeddings for texts, evicting the least recently used entries past the size limit."""
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return
+
+    now = time.time()
+    rows = {}
+    with _lock:
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model, text)
+            vector = np.asarray(vector, dtype=np.float32)
+            _remember(key, vector)
+            rows[key] = (key, EMBEDDING_CACHE_DTYPE, vector.astype(EMBEDDING_CACHE_DTYPE).tobytes(), now)
+
+        connection = _connect()
+        # Take the write lock up front, so the size read and updated here is not changed by another process meanwhile
+        connection.execute("BEGIN IMMEDIATE")
+        # Replaced entries must not be counted twice in the stored size
+        key_list = list(rows)
+        existing = 0
+        for start in range(0, len(key_list), 500):
+            batch = key_list[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            existing += connection.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchone()[0]
+        try:
+            connection.executemany("INSERT OR REPLACE INTO embeddings (key, dtype, vector, last_used) VALUES (?, ?, ?, ?)", rows.values())
+            connection.execute(
+                "UPDATE cache_size SET bytes = bytes + ? WHERE id = 0",
+                (sum(len(row[2]) for row in rows.values()) - existing,)
+            )
+            _counters["writes"] += len(rows)
+
+            stored_bytes = _stored_bytes(connection)
+            limit = EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+            if stored_bytes > limit:
+                _evict(connection, stored_bytes, int(limit * EVICTION_TARGET))
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+def _stored_bytes(connection: sqlite3.Connection) -> int:
+    return connection.execute("SELECT bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+def _evict(connection: sqlite3.Connection, stored_bytes: int, target_bytes: int):
+    # Walk entries from least recently used until enough bytes are freed
+    victims = []
+    freed = 0
+    for key, size in connection.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used").fetchall():
+        if stored_bytes - freed <= target_bytes:
+            break
+        victims.append((key,))
+        freed += size
+    connection.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+    connection.execute("UPDATE cache_size SET bytes = bytes - ? WHERE id = 0", (freed,))
+    _counters["evictions"] += len(victims)
+
+def stats() -> Dict[str, Any]:
+    """Report hit/miss counters and the size of both cache tiers."""
+    with _lock:
+        lookups = _counters["memory_hits"] + _counters["disk_hits"] + _counters["misses"]
+        hits = _counters["memory_hits"] + _counters["disk_hits"]
+        return {
+            "enabled": EMBEDDING_CACHE_ENABLED,
+            **_counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_items": len(_memory),
+            "disk_bytes": _stored_bytes(_connect()) if EMBEDDING_CACHE_ENABLED else 0,
+            "max_bytes": int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+            "dtype": EMBEDDING_CACHE_DTYPE,
+        }
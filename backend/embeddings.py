@@ -0,0 +1,125 @@
+from typing import List, Optional
+from abc import ABC, abstractmethod
+import os
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+# Model libraries take seconds to import, so backends import them on first use
+
+from . import llm_clients
+
+load_dotenv()
+
+# Embedding backend: "openai" calls the embeddings API, "local" runs sentence-transformers on CPU.
+# Changing backend or model needs `python -m backend.cli reembed` before the server will start.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+
+DEFAULT_MODELS = {
+    "openai": "text-embedding-ada-002",
+    "local": "sentence-transformers/all-MiniLM-L6-v2",
+}
+
+# Known OpenAI dimensions, so no API call is needed to size the index
+OPENAI_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+class EmbeddingBackend(ABC):
+    """Interface of an embedding backend; vectors are lists of floats, one per input text."""
+    kind = ""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        """Identifier recorded with the vector index and used to key cached embeddings."""
+        return f"{self.kind}:{self.model}"
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Length of the vectors the backend produces."""
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await asyncio.to_thread(self.embed_documents, [text]))[0]
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API through the shared pooled client."""
+    kind = "openai"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._dimension = OPENAI_DIMENSIONS.get(model)
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = len(llm_clients.get_embeddings(self.model).embed_query("dimension probe"))
+        return self._dimension
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return llm_clients.get_embeddings(self.model).embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await llm_clients.get_embeddings(self.model).aembed_query(text)
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """sentence-transformers model running on CPU in batches."""
+    kind = "local"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model, device="cpu")
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self._load().get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._load().encode(
+            texts, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.tolist()
+
+BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "local": LocalEmbeddingBackend,
+}
+
+# Configured backend, created on first use
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(kind: str, model: Optional[str] = None) -> EmbeddingBackend:
+    """Create a backend by kind, with that kind's default model if none is given."""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {kind}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[kind](model or DEFAULT_MODELS[kind])
+
+def get_backend() -> EmbeddingBackend:
+    """Get the backend configured by EMBEDDING_BACKEND and EMBEDDING_MODEL."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(EMBEDDING_BACKEND, EMBEDDING_MODEL or None)
+    return _backend
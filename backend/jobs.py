@@ -0,0 +1,232 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta, timezone
+import os
+import random
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Job
+
+load_dotenv()
+
+# Durable job queue in the application database. Producers add jobs in their own transaction;
+# worker processes (python -m backend.worker) lease ready jobs with a conditional UPDATE, so
+# several workers can share the queue, and renew the lease while a job runs. A job whose worker
+# died is requeued once its lease expires.
+
+# Job kinds
+PROCESS_DOCUMENT = "process_document"
+UPDATE_CONVERSATION_SUMMARY = "update_conversation_summary"
+COMPACT_VECTOR_STORE = "compact_vector_store"
+
+# Lower runs first: chat summaries go ahead of bulk document ingestion, and index maintenance last
+PRIORITIES = {UPDATE_CONVERSATION_SUMMARY: 0, PROCESS_DOCUMENT: 10, COMPACT_VECTOR_STORE: 20}
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Retry delay after a failed attempt, doubled per attempt up to the maximum
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+# A running job is requeued when its worker has not renewed the lease for this long
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Completed jobs are kept this long, for the latency report
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# Finished jobs the latency report is computed over
+LATENCY_WINDOW = 1000
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands timestamps back without their time zone; the queue only stores UTC
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+async def enqueue(db: AsyncSession, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None, delay: float = 0, max_delay: Optional[float] = None) -> Job:
+    """Add a job to the queue; it is visible to workers once the caller commits.
+
+    With a dedupe key, a job with that key still waiting to run absorbs the request: its start is
+    pushed back to `delay` seconds from now (debouncing), but never past `max_delay` seconds after
+    it was first queued.
+    """
+    now = utcnow()
+    run_at = now + timedelta(seconds=delay)
+    if dedupe_key is not None:
+        job = await db.scalar(
+            select(Job).where(Job.dedupe_key == dedupe_key, Job.status == "queued").order_by(Job.id).limit(1)
+        )
+        if job is not None:
+            if max_delay is not None:
+                run_at = min(run_at, _aware(job.created_at) + timedelta(seconds=max_delay))
+            job.run_at = max(_aware(job.run_at), run_at)
+            return job
+
+    job = Job(
+        kind=kind,
+        payload=payload,
+        priority=PRIORITIES.get(kind, 0),
+        status="queued",
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        dedupe_key=dedupe_key,
+        created_at=now,
+        run_at=run_at
+    )
+    db.add(job)
+    await db.flush()
+    return job
+
+async def claim(db: AsyncSession, worker_id: str, slots: Dict[str, int]) -> List[Job]:
+    """Lease ready jobs to a worker, highest priority first, up to the free slots of each kind."""
+    slots = {kind: count for kind, count in slots.items() if count > 0}
+    if not slots:
+        return []
+
+    now = utcnow()
+    candidates = (await db.execute(
+        select(Job.id, Job.kind)
+        .where(Job.status == "queued", Job.run_at <= now, Job.kind.in_(slots))
+        .order_by(Job.priority, Job.run_at, Job.id)
+        .limit(sum(slots.values()))
+    )).all()
+
+    claimed_ids = []
+    for job_id, kind in candidates:
+        if slots[kind] == 0:
+            continue
+        # Another worker may have claimed the job since it was selected
+        result = await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(
+                status="running",
+                worker_id=worker_id,
+                attempts=Job.attempts + 1,
+                started_at=now,
+                lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            slots[kind] -= 1
+            claimed_ids.append(job_id)
+
+    if not claimed_ids:
+        return []
+    return list((await db.scalars(
+        select(Job).where(Job.id.in_(claimed_ids)).order_by(Job.priority, Job.run_at, Job.id)
+        .execution_options(populate_existing=True)
+    )).all())
+
+async def renew_lease(db: AsyncSession, job: Job, worker_id: str) -> bool:
+    """Extend a running job's lease; False when the worker no longer holds it."""
+    result = await db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "running", Job.worker_id == worker_id)
+        .values(lease_expires_at=utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+    )
+    return result.rowcount == 1
+
+async def complete(db: AsyncSession, job: Job, worker_id: str):
+    """Mark a job the worker holds as done."""
+    await db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "running", Job.worker_id == worker_id)
+        .values(status="completed", finished_at=utcnow(), lease_expires_at=None, last_error=None)
+    )
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt, with jitter so failed jobs do not retry in lockstep."""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+async def fail(db: AsyncSession, job: Job, worker_id: str, error: str):
+    """Record a failed attempt; the job is retried after a backoff until it runs out of attempts."""
+    now = utcnow()
+    if job.attempts >= job.max_attempts:
+        values = {"status": "failed", "finished_at": now}
+    else:
+        values = {"status": "queued", "run_at": now + timedelta(seconds=retry_delay(job.attempts))}
+    await db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "running", Job.worker_id == worker_id)
+        .values(worker_id=None, lease_expires_at=None, last_error=error, **values)
+    )
+
+async def requeue_expired(db: AsyncSession) -> int:
+    """Requeue running jobs whose worker stopped renewing the lease, or fail them when out of attempts."""
+    now = utcnow()
+    expired = (Job.status == "running", Job.lease_expires_at < now)
+    await db.execute(
+        update(Job)
+        .where(*expired, Job.attempts >= Job.max_attempts)
+        .values(status="failed", finished_at=now, worker_id=None, lease_expires_at=None, last_error="Lease expired")
+    )
+    result = await db.execute(
+        update(Job)
+        .where(*expired)
+        .values(status="queued", run_at=now, worker_id=None, lease_expires_at=None, last_error="Lease expired")
+    )
+    return result.rowcount
+
+async def purge_finished(db: AsyncSession) -> int:
+    """Delete completed jobs past the retention period; failed jobs are kept for inspection."""
+    cutoff = utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+    result = await db.execute(delete(Job).where(Job.status == "completed", Job.finished_at < cutoff))
+    return result.rowcount
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(ordered[min(len(ordered) - 1, int(0.50 * len(ordered)))] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+async def stats(db: AsyncSession) -> Dict[str, Any]:
+    """Report queue depth per kind and status, and wait and run times of recently completed jobs."""
+    now = utcnow()
+    depth: Dict[str, Dict[str, int]] = {}
+    # One expression object for both clauses, so they share a bind parameter; PostgreSQL rejects
+    # a select-list expression whose GROUP BY copy has a parameter of its own
+    ready = (Job.run_at <= now).label("ready")
+    rows = await db.execute(
+        select(Job.kind, Job.status, ready, func.count())
+        .where(Job.status.in_(("queued", "running", "failed")))
+        .group_by(Job.kind, Job.status, ready)
+    )
+    for kind, status, ready, count in rows:
+        # Queued jobs are either ready or waiting out a debounce or retry delay
+        if status == "queued":
+            status = "ready" if ready else "scheduled"
+        counts = depth.setdefault(kind, {"ready": 0, "scheduled": 0, "running": 0, "failed": 0})
+        counts[status] += count
+
+    oldest_ready = await db.scalar(select(func.min(Job.run_at)).where(Job.status == "queued", Job.run_at <= now))
+
+    # Wait is the time a ready job spent before a worker started it; run is its last attempt
+    latency: Dict[str, Dict[str, List[float]]] = {}
+    recent = await db.execute(
+        select(Job.kind, Job.run_at, Job.started_at, Job.finished_at)
+        .where(Job.status == "completed")
+        .order_by(Job.finished_at.desc())
+        .limit(LATENCY_WINDOW)
+    )
+    for kind, run_at, started_at, finished_at in recent:
+        samples = latency.setdefault(kind, {"wait": [], "run": []})
+        samples["wait"].append(max((_aware(started_at) - _aware(run_at)).total_seconds(), 0))
+        samples["run"].append((_aware(finished_at) - _aware(started_at)).total_seconds())
+
+    return {
+        "depth": depth,
+        "oldest_ready_seconds": round((now - _aware(oldest_ready)).total_seconds(), 3) if oldest_ready else None,
+        "latency": {
+            kind: {"wait": _percentiles(samples["wait"]), "run": _percentiles(samples["run"])}
+            for kind, samples in latency.items()
+        },
+    }
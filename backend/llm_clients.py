@@ -0,0 +1,129 @@
+from typing import Dict, Any, Tuple
+import os
+import threading
+from dotenv import load_dotenv
+import httpx
+
+# LangChain takes seconds to import, so the model classes are imported on first use
+
+load_dotenv()
+
+# HTTP connection pool shared by every model client in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# Shared HTTP clients and model instances, created on first use
+_http_client = None
+_http_async_client = None
+_chat_models: Dict[Tuple[str, float], Any] = {}
+_embeddings: Dict[str, Any] = {}
+_lock = threading.Lock()
+_requests = {"sync": 0, "async": 0}
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+def _count_sync(request):
+    _requests["sync"] += 1
+
+async def _count_async(request):
+    _requests["async"] += 1
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Get the process-wide keep-alive HTTP clients used for model API calls."""
+    global _http_client, _http_async_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_async_client = httpx.AsyncClient(
+                    limits=_limits(), timeout=_timeout(), event_hooks={"request": [_count_async]}
+                )
+                _http_client = httpx.Client(
+                    limits=_limits(), timeout=_timeout(), event_hooks={"request": [_count_sync]}
+                )
+    return _http_client, _http_async_client
+
+def get_chat_model(model: str = "gpt-4o", temperature: float = 0.7):
+    """Get the shared chat model for a model name and temperature."""
+    key = (model, temperature)
+    llm = _chat_models.get(key)
+    if llm is None:
+        http_client, http_async_client = get_http_clients()
+        with _lock:
+            llm = _chat_models.get(key)
+            if llm is None:
+                from langchain_openai import ChatOpenAI
+                llm = _chat_models[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    request_timeout=_timeout(),
+                    max_retries=LLM_MAX_RETRIES,
+                )
+    return llm
+
+def get_embeddings(model: str = "text-embedding-ada-002"):
+    """Get the shared OpenAI embeddings client for a model."""
+    embeddings = _embeddings.get(model)
+    if embeddings is None:
+        http_client, http_async_client = get_http_clients()
+        with _lock:
+            embeddings = _embeddings.get(model)
+            if embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                embeddings = _embeddings[model] = OpenAIEmbeddings(
+                    model=model,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    request_timeout=_timeout(),
+                    max_retries=LLM_MAX_RETRIES,
+                )
+    return embeddings
+
+def _pool_stats(client) -> Dict[str, Any]:
+    # httpx does not expose its connection pool publicly; report what the transport's pool holds
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    active = sum(1 for connection in connections if not connection.is_idle())
+    return {
+        "open_connections": len(connections),
+        "active_connections": active,
+        "idle_connections": len(connections) - active,
+        "utilization": round(active / LLM_MAX_CONNECTIONS, 3),
+    }
+
+def stats() -> Dict[str, Any]:
+    """Report pool limits, connection usage and request counts of the shared clients."""
+    report = {
+        "max_connections": LLM_MAX_CONNECTIONS,
+        "max_keepalive_connections": LLM_MAX_KEEPALIVE_CONNECTIONS,
+        "chat_models": sorted(f"{model}@{temperature}" for model, temperature in _chat_models),
+        "embedding_models": sorted(_embeddings),
+        "requests": dict(_requests),
+    }
+    if _http_client is not None:
+        report["sync_pool"] = _pool_stats(_http_client)
+        report["async_pool"] = _pool_stats(_http_async_client)
+    return report
+
+async def aclose():
+    """Close the shared HTTP clients; called on application shutdown."""
+    global _http_client, _http_async_client
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_client.close()
+        _http_client = _http_async_client = None
+        _chat_models.clear()
+        _embeddings.clear()
@@ -1,39 +1,129 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, File, UploadFile, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+from sqlalchemy import text, func, select, delete, or_, and_, cast, literal, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
+import asyncio
+import base64
 import os
 import json
+import time
+import anyio
 import uvicorn
 
 # Import your modules
-from .database import get_db, engine
-from .models import Base, User, Conversation, Message, Document, UserProfile
+from .database import get_db, async_engine, AsyncSessionLocal, upgrade_database, pool_stats
+from .models import Base, User, Conversation, Message, Document, DocumentChunk, UserProfile, Job
 from .schemas import (
     UserCreate, UserResponse, ConversationCreate, ConversationUpdate, 
     MessageCreate, DocumentCreate, UserProfileCreate, UserProfileResponse,
     ChatCompletionRequest, ChatCompletionResponse, ChatMessage
 )
-from .auth import create_access_token, get_password_hash, verify_password, get_current_user
+from .auth import create_access_token, get_current_user
+from .passwords import ahash_password, averify_password
 from .rag import (
-    query_documents, process_document, initialize_vector_store, 
-    analyze_sentiment, detect_intent, generate_conversation_summary
+    query_documents, prepare_rag_prompt, rag_metadata, lookup_cached_answer, initialize_vector_store,
+    get_embeddings_model
+)
+from . import vector_store
+from . import classifier
+from . import metrics
+from . import llm_clients
+from . import embedding_cache
+from . import answer_cache
+from . import prompt_cache
+from . import principal_cache
+from . import passwords
+from . import summaries
+from . import jobs
+from . import document_text
+from .memory import (
+    get_conversation_history, get_user_conversation_summaries, record_user_message,
+    remove_conversation_from_rollups, rollups_need_backfill, rebuild_rollups
 )
-from .memory import get_conversation_history, get_user_conversation_summaries
 from .personalization import (
     get_or_create_user_profile, update_user_profile, 
-    create_personalized_prompt, analyze_conversation_for_insights
+    create_personalized_prompt, get_prompt_prefix, analyze_conversation_for_insights
 )
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Warm-up mode: "blocking" finishes warm-up before accepting traffic, "background" warms up
+# after startup, "off" leaves everything to load on first use
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
+
+# List endpoints return pages of this many rows by default, and never more than the maximum
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+# Rows fetched per round trip when streaming an NDJSON export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Bytes of an uploaded file returned as its content by GET /api/documents?include_content=true
+DOCUMENT_PREVIEW_BYTES = int(os.getenv("DOCUMENT_PREVIEW_BYTES", str(64 * 1024)))
+
+# Warm-up progress, reported by the readiness endpoint
+warmup_state: Dict[str, Any] = {"status": "pending", "steps": {}, "error": None}
+
+def _create_chat_clients():
+    llm_clients.get_chat_model("gpt-4o", temperature=0.7)
+    llm_clients.get_chat_model("gpt-3.5-turbo", temperature=0)
+
+async def _open_database_pool():
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+async def warm_up():
+    """Load the vector index, import the model clients and open a database connection."""
+    warmup_state["status"] = "warming"
+    steps = [
+        ("vector_store", initialize_vector_store),
+        ("embeddings_client", get_embeddings_model),
+        ("chat_clients", _create_chat_clients),
+        ("database_pool", _open_database_pool),
+        ("password_workers", passwords.start_workers),
+    ]
+    if classifier.CLASSIFIER_BACKEND == "local":
+        steps.append(("classifier", classifier.load_local_model))
+    try:
+        for name, step in steps:
+            step_start = time.perf_counter()
+            # Blocking steps run in a worker thread so the event loop keeps serving
+            if asyncio.iscoroutinefunction(step):
+                await step()
+            else:
+                await asyncio.to_thread(step)
+            warmup_state["steps"][name] = time.perf_counter() - step_start
+        warmup_state["status"] = "ready"
+    except Exception as e:
+        warmup_state["status"] = "failed"
+        warmup_state["error"] = str(e)
+        print(f"Warm-up failed: {str(e)}")
 
-# Initialize vector store
-initialize_vector_store()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create or migrate database tables
+    upgrade_database()
+    
+    # Count messages written before the rollup table existed
+    async with AsyncSessionLocal() as db:
+        if await rollups_need_backfill(db):
+            print(f"Backfilled {await rebuild_rollups(db)} user message rollup buckets")
+    
+    if WARMUP_MODE == "blocking":
+        await warm_up()
+    elif WARMUP_MODE == "background":
+        app.state.warmup_task = asyncio.create_task(warm_up())
+    else:
+        warmup_state["status"] = "lazy"
+    yield
+    
+    # Close pooled connections to the model API and the database
+    await llm_clients.aclose()
+    await async_engine.dispose()
+    passwords.shutdown()
 
-app = FastAPI(title="Mental Health Support API")
+app = FastAPI(title="Mental Health Support API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -42,18 +132,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Health routes
+@app.get("/api/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def readiness():
+    # Lazy mode is ready as soon as it starts; everything else waits for warm-up
+    ready = warmup_state["status"] in ("ready", "lazy")
+    try:
+        await _open_database_pool()
+    except Exception as e:
+        ready = False
+        warmup_state["error"] = str(e)
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, **warmup_state})
+
 # Authentication routes
 @app.post("/api/auth/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    # End the read transaction so the pooled connection is not held while hashing
+    await db.commit()
+    hashed_password = await ahash_password(user.password)
     db_user = User(
         email=user.email,
         name=user.name,
@@ -61,13 +170,13 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         role="patient"  # Default role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Create default user profile
     profile = UserProfile(user_id=db_user.id)
     db.add(profile)
-    db.commit()
+    await db.commit()
     
     # Generate token
     access_token = create_access_token(data={"sub": db_user.email})
@@ -82,16 +191,23 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Find user
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    await db.commit()
+    valid, new_hash = await averify_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # The stored hash used another work factor; replace it while the password is at hand
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
     # Generate token
     access_token = create_access_token(data={"sub": user.email})
     
@@ -107,52 +223,68 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 # User profile routes
 @app.get("/api/users/me/profile", response_model=UserProfileResponse)
-async def get_user_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    profile = get_or_create_user_profile(db, current_user.id)
+async def get_user_profile(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    profile = await get_or_create_user_profile(db, current_user.id)
     return profile
 
 @app.put("/api/users/me/profile", response_model=UserProfileResponse)
-async def update_user_profile_endpoint(profile: UserProfileCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    updated_profile = update_user_profile(db, current_user.id, profile.dict())
+async def update_user_profile_endpoint(profile: UserProfileCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    updated_profile = await update_user_profile(db, current_user.id, profile.dict())
     return updated_profile
 
 @app.put("/api/users/me/preferences")
-async def update_user_preferences(preferences: Dict[str, Any], current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == current_user.id).first()
+async def update_user_preferences(preferences: Dict[str, Any], current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == current_user.id))
     user.preferences = preferences
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate(user.id)
     return {"status": "success", "preferences": user.preferences}
 
 # Conversation routes
 @app.post("/api/conversations", response_model=Dict[str, Any])
-async def create_conversation(conversation: ConversationCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_conversation(conversation: ConversationCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     db_conversation = Conversation(
         title=conversation.title,
         user_id=current_user.id
     )
     db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
+    prompt_cache.bump(prompt_cache.SUMMARY, current_user.id)
     
     return {"id": db_conversation.id, "title": db_conversation.title}
 
 @app.get("/api/conversations", response_model=List[Dict[str, Any]])
-async def get_conversations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    conversations = db.query(Conversation).filter(Conversation.user_id == current_user.id).all()
-    return [{
-        "id": conv.id,
-        "title": conv.title,
-        "created_at": conv.created_at,
-        "updated_at": conv.updated_at,
-        "message_count": len(conv.messages),
-        "summary": conv.summary,
-        "sentiment": conv.sentiment
-    } for conv in conversations]
+async def get_conversations(
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Counts come from one grouped subquery, so listing never loads the messages themselves
+    counts = message_counts_subquery(current_user.id)
+    query = select(
+        Conversation.id,
+        Conversation.title,
+        Conversation.created_at,
+        Conversation.updated_at,
+        func.coalesce(counts.c.message_count, 0).label("message_count"),
+        Conversation.summary,
+        Conversation.sentiment
+    ).outerjoin(
+        counts, counts.c.conversation_id == Conversation.id
+    ).where(Conversation.user_id == current_user.id)
+    
+    if format == "ndjson":
+        return await stream_ndjson(db, query, Conversation)
+    return await paginate(db, response, query, Conversation, cursor, limit)
 
 @app.get("/api/conversations/{conversation_id}", response_model=Dict[str, Any])
-async def get_conversation(conversation_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id).first()
+async def get_conversation(conversation_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -161,14 +293,14 @@ async def get_conversation(conversation_id: int, current_user: User = Depends(ge
         "title": conversation.title,
         "created_at": conversation.created_at,
         "updated_at": conversation.updated_at,
-        "message_count": len(conversation.messages),
+        "message_count": await db.scalar(select(func.count(Message.id)).where(Message.conversation_id == conversation_id)),
         "summary": conversation.summary,
         "sentiment": conversation.sentiment
     }
 
 @app.put("/api/conversations/{conversation_id}", response_model=Dict[str, Any])
-async def update_conversation(conversation_id: int, conversation: ConversationUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_conversation = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id).first()
+async def update_conversation(conversation_id: int, conversation: ConversationUpdate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    db_conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
     if not db_conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -178,8 +310,9 @@ async def update_conversation(conversation_id: int, conversation: ConversationUp
     if conversation.summary is not None:
         db_conversation.summary = conversation.summary
     
-    db.commit()
-    db.refresh(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
+    prompt_cache.bump(prompt_cache.SUMMARY, current_user.id)
     
     return {
         "id": db_conversation.id,
@@ -191,31 +324,36 @@ async def update_conversation(conversation_id: int, conversation: ConversationUp
     }
 
 @app.delete("/api/conversations/{conversation_id}")
-async def delete_conversation(conversation_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_conversation = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id).first()
+async def delete_conversation(conversation_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    db_conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
     if not db_conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Delete all messages in the conversation
-    db.query(Message).filter(Message.conversation_id == conversation_id).delete()
+    # Take the messages out of the user's pattern rollups, then delete them
+    await remove_conversation_from_rollups(db, conversation_id)
+    await db.execute(delete(Message).where(Message.conversation_id == conversation_id))
     
     # Delete the conversation
-    db.delete(db_conversation)
-    db.commit()
+    await db.delete(db_conversation)
+    await db.commit()
+    prompt_cache.bump(prompt_cache.SUMMARY, current_user.id)
+    prompt_cache.bump(prompt_cache.ROLLUP, current_user.id)
     
     return {"status": "success"}
 
 # Message routes
 @app.post("/api/conversations/{conversation_id}/messages", response_model=Dict[str, Any])
-async def create_message(conversation_id: int, message: MessageCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_message(conversation_id: int, message: MessageCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify conversation exists and belongs to user
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id).first()
+    conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Analyze user message sentiment and intent
-    sentiment = analyze_sentiment(message.content)
-    intent = detect_intent(message.content)
+    # End the read transaction so the pooled connection is not held while waiting on the model
+    await db.commit()
+    
+    # Classify user message sentiment and intent
+    sentiment, intent = await classifier.classify_message(message.content)
     
     # Create user message
     db_message = Message(
@@ -226,8 +364,11 @@ async def create_message(conversation_id: int, message: MessageCreate, backgroun
         intent=intent
     )
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    # Counted in the same transaction as the insert, so rollups never drift from the messages
+    await record_user_message(db, current_user.id, sentiment, intent)
+    await db.commit()
+    prompt_cache.bump(prompt_cache.ROLLUP, current_user.id)
+    await db.refresh(db_message)
     
     # Generate AI response using RAG if needed
     ai_response = ""
@@ -235,36 +376,16 @@ async def create_message(conversation_id: int, message: MessageCreate, backgroun
     
     if message.use_rag:
         # Query documents using RAG with personalization
-        ai_response, metadata = query_documents(db, message.content, current_user.id)
+        ai_response, metadata = await query_documents(db, message.content, current_user.id)
     else:
-        # Create personalized prompt
-        system_prompt = create_personalized_prompt(db, current_user.id, conversation_id)
-        
-        # Format messages for OpenAI
-        chat_messages = [
-            ChatMessage(role="system", content=system_prompt)
-        ]
+        request = await build_chat_request(db, current_user.id, conversation_id, message.content)
         
-        # Add recent conversation history (last 5 messages)
-        history = get_conversation_history(db, conversation_id, limit=5)
-        for hist_msg in history:
-            role = "assistant" if hist_msg["sender"] == "ai" else "user"
-            chat_messages.append(ChatMessage(role=role, content=hist_msg["content"]))
-        
-        # Add current message
-        chat_messages.append(ChatMessage(role="user", content=message.content))
-        
-        # Create request
-        request = ChatCompletionRequest(
-            messages=chat_messages,
-            user_id=current_user.id,
-            conversation_id=conversation_id
-        )
+        # Release the pooled connection before waiting on the model
+        await db.commit()
         
         # Get response from OpenAI
-        from langchain_openai import ChatOpenAI
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
-        response = llm.invoke(request.messages[-1].content)
+        llm = llm_clients.get_chat_model("gpt-4o", temperature=0.7)
+        response = await llm.ainvoke(chat_model_input(request), prompt_cache_key=request.prompt_cache_key)
         ai_response = response.content
         
         # Create metadata
@@ -282,13 +403,13 @@ async def create_message(conversation_id: int, message: MessageCreate, backgroun
         message_metadata=metadata
     )
     db.add(ai_message)
-    db.commit()
-    db.refresh(ai_message)
+    await db.commit()
+    await db.refresh(ai_message)
     
-    # Update conversation in background
-    background_tasks.add_task(update_conversation_metadata, db, conversation_id)
+    # Update conversation in background, once the conversation goes quiet
+    background_tasks.add_task(summaries.schedule_update, conversation_id)
     
-    return {
+    response = {
         "user_message": {
             "id": db_message.id,
             "content": db_message.content,
@@ -305,28 +426,167 @@ async def create_message(conversation_id: int, message: MessageCreate, backgroun
             "metadata": ai_message.message_metadata
         }
     }
+    
+    # The request session stays open until the background task finishes, so release its connection now
+    await db.commit()
+    
+    return response
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+@app.post("/api/conversations/{conversation_id}/messages/stream")
+async def stream_message(conversation_id: int, message: MessageCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Like create_message, but streams the AI response as Server-Sent Events."""
+    # Verify conversation exists and belongs to user
+    conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    user_id = current_user.id
+    await db.commit()
+    
+    started = time.perf_counter()
+    sentiment, intent = await classifier.classify_message(message.content)
+    
+    # Create user message
+    db_message = Message(
+        content=message.content,
+        sender="user",
+        conversation_id=conversation_id,
+        sentiment=sentiment,
+        intent=intent
+    )
+    db.add(db_message)
+    # Counted in the same transaction as the insert, so rollups never drift from the messages
+    await record_user_message(db, user_id, sentiment, intent)
+    await db.commit()
+    prompt_cache.bump(prompt_cache.ROLLUP, user_id)
+    await db.refresh(db_message)
+    user_message = {
+        "id": db_message.id,
+        "content": db_message.content,
+        "sender": db_message.sender,
+        "created_at": db_message.created_at,
+        "sentiment": db_message.sentiment,
+        "intent": db_message.intent
+    }
+    
+    # Build the prompt up front, so the stream itself needs no database access until it is saved
+    relevant_chunks = None
+    cached, cache_key = None, {}
+    model_kwargs = {}
+    if message.use_rag:
+        prompt, relevant_chunks = await prepare_rag_prompt(db, message.content, user_id)
+        cached, cache_key = await lookup_cached_answer(message.content, prompt, relevant_chunks, user_id)
+    else:
+        request = await build_chat_request(db, user_id, conversation_id, message.content)
+        prompt = chat_model_input(request)
+        model_kwargs = {"prompt_cache_key": request.prompt_cache_key}
+    await db.commit()
+    
+    async def save_ai_message(content: str, timings: Dict[str, Any], completed: bool) -> Message:
+        # The request session may already be closed once streaming starts, so use a fresh one
+        if relevant_chunks is not None:
+            metadata = rag_metadata(relevant_chunks, time.perf_counter() - started, user_id)
+        else:
+            metadata = {"model": "gpt-4o", "personalized": True, "processing_time": time.perf_counter() - started}
+        metadata.update(timings, streamed=True, completed=completed)
+        
+        async with AsyncSessionLocal() as session:
+            ai_message = Message(content=content, sender="ai", conversation_id=conversation_id, message_metadata=metadata)
+            session.add(ai_message)
+            await session.commit()
+            await session.refresh(ai_message)
+            return ai_message
+    
+    async def event_stream():
+        llm = llm_clients.get_chat_model("gpt-4o", temperature=0.7)
+        
+        parts = []
+        timings = {}
+        saved = False
+        yield _sse("user_message", user_message)
+        try:
+            if cached is not None:
+                # A cached answer is sent as a single token
+                timings["answer_cache"] = {"hit": True, "similarity": cached["similarity"], "entry_hits": cached["hits"]}
+                parts.append(cached["answer"])
+                yield _sse("token", {"content": cached["answer"]})
+            else:
+                async for chunk in llm.astream(prompt, **model_kwargs):
+                    if not chunk.content:
+                        continue
+                    if "time_to_first_token" not in timings:
+                        timings["time_to_first_token"] = time.perf_counter() - started
+                        metrics.observe("chat_stream_ttft", timings["time_to_first_token"])
+                    parts.append(chunk.content)
+                    yield _sse("token", {"content": chunk.content})
+                if cache_key:
+                    answer_cache.store(answer="".join(parts), **cache_key)
+            
+            metrics.observe("chat_stream_total", time.perf_counter() - started)
+            ai_message = await save_ai_message("".join(parts), timings, completed=True)
+            saved = True
+            yield _sse("done", {
+                "id": ai_message.id,
+                "content": ai_message.content,
+                "sender": ai_message.sender,
+                "created_at": ai_message.created_at,
+                "metadata": ai_message.message_metadata
+            })
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+            metrics.increment("chat_stream_errors")
+            yield _sse("error", {"detail": "The response could not be completed"})
+        finally:
+            # Client disconnected or the model failed: keep what was generated so the history stays consistent
+            if not saved:
+                if parts:
+                    # Shielded, so the save still runs when the stream is being cancelled
+                    with anyio.CancelScope(shield=True):
+                        await save_ai_message("".join(parts), timings, completed=False)
+                metrics.increment("chat_stream_incomplete")
+    
+    # Runs once the stream ends, including after a disconnect
+    background_tasks.add_task(summaries.schedule_update, conversation_id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
 
 @app.get("/api/conversations/{conversation_id}/messages", response_model=List[Dict[str, Any]])
-async def get_messages(conversation_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_messages(
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_content: bool = True,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     # Verify conversation exists and belongs to user
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id).first()
+    conversation = await db.scalar(select(Conversation.id).where(Conversation.id == conversation_id, Conversation.user_id == current_user.id))
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).all()
-    return [{
-        "id": msg.id,
-        "content": msg.content,
-        "sender": msg.sender,
-        "created_at": msg.created_at,
-        "sentiment": msg.sentiment,
-        "intent": msg.intent,
-        "metadata": msg.message_metadata
-    } for msg in messages]
+    # Only the requested columns are loaded; message text is skipped with include_content=false
+    columns = [Message.id]
+    if include_content:
+        columns.append(Message.content)
+    columns += [Message.sender, Message.created_at, Message.sentiment, Message.intent, Message.message_metadata.label("metadata")]
+    query = select(*columns).where(Message.conversation_id == conversation_id)
+    
+    if format == "ndjson":
+        return await stream_ndjson(db, query, Message)
+    return await paginate(db, response, query, Message, cursor, limit)
 
 # Document routes (for RAG)
 @app.post("/api/documents", response_model=Dict[str, Any])
-async def upload_document(document: DocumentCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def upload_document(document: DocumentCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify user is admin
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to upload documents")
@@ -340,11 +600,12 @@ async def upload_document(document: DocumentCreate, background_tasks: Background
         embedding_status="pending"
     )
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.flush()
     
-    # Process document in background
-    background_tasks.add_task(process_document, db, db_document.id)
+    # Queue the document for the worker, in the same transaction so it cannot be lost
+    await jobs.enqueue(db, jobs.PROCESS_DOCUMENT, {"document_id": db_document.id}, dedupe_key=f"document:{db_document.id}")
+    await db.commit()
+    await db.refresh(db_document)
     
     return {
         "id": db_document.id,
@@ -357,33 +618,36 @@ async def upload_document_file(
     file: UploadFile = File(...),
     document_type: Optional[str] = None,
     context_notes: Optional[str] = None,
-    background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Verify user is admin
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to upload documents")
     
-    # Read file content
-    content = await file.read()
-    content_text = content.decode("utf-8")
+    # Stream the file to disk; the worker reads it back a block at a time
+    try:
+        source_path, source_encoding, _ = await document_text.spool_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     # Create document
     db_document = Document(
         name=file.filename,
-        content=content_text,
+        source_path=source_path,
+        source_encoding=source_encoding,
         context_notes=context_notes,
         document_type=document_type,
         status="processing",  # Initial status
         embedding_status="pending"
     )
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.flush()
     
-    # Process document in background
-    background_tasks.add_task(process_document, db, db_document.id)
+    # Queue the document for the worker, in the same transaction so it cannot be lost
+    await jobs.enqueue(db, jobs.PROCESS_DOCUMENT, {"document_id": db_document.id}, dedupe_key=f"document:{db_document.id}")
+    await db.commit()
+    await db.refresh(db_document)
     
     return {
         "id": db_document.id,
@@ -392,62 +656,175 @@ async def upload_document_file(
     }
 
 @app.get("/api/documents", response_model=List[Dict[str, Any]])
-async def get_documents(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_documents(
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_content: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     # Verify user is admin
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to view documents")
     
-    documents = db.query(Document).all()
-    return [{
-        "id": doc.id,
-        "name": doc.name,
-        "status": doc.status,
-        "created_at": doc.created_at,
-        "context_notes": doc.context_notes,
-        "document_type": doc.document_type,
-        "embedding_status": doc.embedding_status,
-        "chunk_count": doc.chunk_count
-    } for doc in documents]
+    # Document text can be large, so it is only loaded when asked for
+    columns = [
+        Document.id,
+        Document.name,
+        Document.status,
+        Document.created_at,
+        Document.context_notes,
+        Document.document_type,
+        Document.embedding_status,
+        Document.chunk_count,
+        Document.processing_stats
+    ]
+    if include_content:
+        columns.extend([Document.content, Document.source_path, Document.source_encoding])
+    query = select(*columns)
+    prepare_row = add_file_content if include_content else None
+    
+    if format == "ndjson":
+        return await stream_ndjson(db, query, Document, prepare_row)
+    rows = await paginate(db, response, query, Document, cursor, limit)
+    if prepare_row:
+        rows = [await prepare_row(row) for row in rows]
+    return rows
+
+async def add_file_content(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in the content of an uploaded document from the start of its file, flagging whether it was cut short."""
+    source_path = row.pop("source_path")
+    source_encoding = row.pop("source_encoding")
+    row["content_truncated"] = False
+    if row["content"] is None and source_path:
+        try:
+            row["content"], row["content_truncated"] = await asyncio.to_thread(
+                document_text.read_text_preview, source_path, source_encoding or "utf-8", DOCUMENT_PREVIEW_BYTES
+            )
+        except OSError as e:
+            print(f"Error reading document file {source_path}: {str(e)}")
+    return row
+
+@app.post("/api/documents/{document_id}/reprocess", response_model=Dict[str, Any])
+async def reprocess_document(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Verify user is admin
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to process documents")
+    
+    document = await db.scalar(select(Document).where(Document.id == document_id))
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    document.status = "processing"
+    document.embedding_status = "pending"
+    
+    # Queue re-ingestion; the new chunks replace the old ones in the vector store
+    await jobs.enqueue(db, jobs.PROCESS_DOCUMENT, {"document_id": document.id}, dedupe_key=f"document:{document.id}")
+    await db.commit()
+    
+    return {
+        "id": document.id,
+        "name": document.name,
+        "status": document.status
+    }
 
 @app.delete("/api/documents/{document_id}")
-async def delete_document(document_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_document(document_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify user is admin
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete documents")
     
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Delete document chunks
-    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+    chunk_ids = (await db.scalars(select(DocumentChunk.id).where(DocumentChunk.document_id == document_id))).all()
+    await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
     
     # Delete document
-    db.delete(document)
-    db.commit()
+    await db.delete(document)
+    await db.commit()
+    document_text.remove_upload(document.source_path)
     
-    # Note: In a real implementation, you would also remove the document from the vector store
+    # Tombstone the vectors so they stop appearing in search results right away
+    await asyncio.to_thread(vector_store.remove_chunks, chunk_ids)
+    answer_cache.invalidate_documents([document_id])
+    
+    # A worker rebuilds the index once enough vectors are tombstoned
+    await jobs.enqueue(db, jobs.COMPACT_VECTOR_STORE, {"force": False}, dedupe_key="vector_store:compact_if_needed")
+    await db.commit()
     
     return {"status": "success"}
 
+# Admin routes
+@app.get("/api/admin/vector-store", response_model=Dict[str, Any])
+async def get_vector_store_stats(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Verify user is admin
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view vector store statistics")
+    
+    # Compaction runs in the workers, so its progress is read from the job queue
+    compacting = await db.scalar(
+        select(func.count()).select_from(Job).where(Job.kind == jobs.COMPACT_VECTOR_STORE, Job.status == "running")
+    )
+    return {**vector_store.stats(), "compaction_running": bool(compacting)}
+
+@app.post("/api/admin/vector-store/compact", response_model=Dict[str, Any])
+async def compact_vector_store(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Verify user is admin
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to compact the vector store")
+    
+    job = await jobs.enqueue(db, jobs.COMPACT_VECTOR_STORE, {"force": True}, dedupe_key="vector_store:compact")
+    await db.commit()
+    
+    return {"status": "scheduled", "job_id": job.id, **vector_store.stats()}
+
+@app.get("/api/admin/jobs", response_model=Dict[str, Any])
+async def get_job_queue_stats(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Verify user is admin
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view the job queue")
+    
+    return await jobs.stats(db)
+
+@app.get("/api/admin/metrics", response_model=Dict[str, Any])
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    # Verify user is admin
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view metrics")
+    
+    return {
+        **metrics.snapshot(),
+        "llm_clients": llm_clients.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "database": pool_stats()
+    }
+
 # Analytics routes
 @app.get("/api/analytics/user/{user_id}", response_model=Dict[str, Any])
-async def get_user_analytics(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_analytics(user_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify user is admin or the user themselves
     if current_user.role != "admin" and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to view this user's analytics")
     
     # Get user
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get conversation summaries
-    conversation_summaries = get_user_conversation_summaries(db, user_id)
+    conversation_summaries = await get_user_conversation_summaries(db, user_id)
     
     # Get message patterns
     from .memory import get_user_message_patterns
-    message_patterns = get_user_message_patterns(db, user_id)
+    message_patterns = await get_user_message_patterns(db, user_id)
     
     return {
         "user_id": user_id,
@@ -457,9 +834,9 @@ async def get_user_analytics(user_id: int, current_user: User = Depends(get_curr
     }
 
 @app.get("/api/analytics/conversation/{conversation_id}", response_model=Dict[str, Any])
-async def get_conversation_analytics(conversation_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_conversation_analytics(conversation_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify conversation exists and user has access
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id))
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -467,10 +844,10 @@ async def get_conversation_analytics(conversation_id: int, current_user: User =
         raise HTTPException(status_code=403, detail="Not authorized to view this conversation")
     
     # Get conversation insights
-    insights = analyze_conversation_for_insights(db, conversation_id)
+    insights = await analyze_conversation_for_insights(db, conversation_id)
     
     # Get messages
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).all()
+    messages = (await db.scalars(select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at))).all()
     
     # Calculate statistics
     user_message_count = len([msg for msg in messages if msg.sender == "user"])
@@ -496,56 +873,107 @@ async def get_conversation_analytics(conversation_id: int, current_user: User =
     }
 
 # Helper functions
-async def update_conversation_metadata(db: Session, conversation_id: int):
-    """Update conversation metadata like summary and sentiment."""
-    # Create a new session since this runs in a background task
-    from .database import SessionLocal
-    db = SessionLocal()
-    
+def _encode_cursor(created_at: str, row_id: int) -> str:
+    """Pack the stored created_at text and id of the last row into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
     try:
-        # Get conversation
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation:
-            return
-        
-        # Get messages
-        messages = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).all()
-        if not messages:
-            return
-        
-        # Format messages for summary generation
-        formatted_messages = [{
-            "content": msg.content,
-            "sender": msg.sender,
-            "created_at": msg.created_at
-        } for msg in messages]
-        
-        # Generate summary
-        summary = generate_conversation_summary(formatted_messages)
-        
-        # Determine overall sentiment
-        user_messages = [msg for msg in messages if msg.sender == "user"]
-        sentiments = [msg.sentiment for msg in user_messages if msg.sentiment]
-        
-        overall_sentiment = "neutral"
-        if sentiments:
-            positive_count = sentiments.count("positive")
-            negative_count = sentiments.count("negative")
-            neutral_count = sentiments.count("neutral")
-            
-            if positive_count > negative_count and positive_count > neutral_count:
-                overall_sentiment = "positive"
-            elif negative_count > positive_count and negative_count > neutral_count:
-                overall_sentiment = "negative"
-            else:
-                overall_sentiment = "neutral"
-        
-        # Update conversation
-        conversation.summary = summary
-        conversation.sentiment = overall_sentiment
-        db.commit()
-    finally:
-        db.close()
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(db: AsyncSession, response: Response, query, model, cursor: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Return one page of a column select in (created_at, id) order, setting X-Next-Cursor when more rows follow."""
+    # The cursor carries the created_at text exactly as the database returns it, so paging continues past deleted rows
+    created_at_text = cast(model.created_at, String)
+    if cursor is not None:
+        after_created_at, after_id = _decode_cursor(cursor)
+        if async_engine.dialect.name == "sqlite":
+            # SQLite stores timestamps as text, so compare the stored text as-is
+            anchor = literal(after_created_at, String)
+        else:
+            anchor = cast(literal(after_created_at, String), model.created_at.type)
+        query = query.where(or_(
+            model.created_at > anchor,
+            and_(model.created_at == anchor, model.id > after_id)
+        ))
+    
+    query = query.add_columns(created_at_text.label("_cursor_created_at"))
+    rows = (await db.execute(query.order_by(model.created_at, model.id).limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1]._cursor_created_at, rows[-1].id)
+    page = []
+    for row in rows:
+        item = dict(row._mapping)
+        item.pop("_cursor_created_at")
+        page.append(item)
+    return page
+
+def _json_default(value: Any):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+async def stream_ndjson(db: AsyncSession, query, model, prepare_row=None) -> StreamingResponse:
+    """Stream every row of a column select as newline-delimited JSON, fetching in batches and awaiting prepare_row on each row if given."""
+    # Release the request's pooled connection; the export reads on its own session
+    await db.commit()
+    
+    async def lines():
+        # The request session may be closed before the export finishes, so use a fresh one
+        async with AsyncSessionLocal() as session:
+            rows = await session.stream(query.order_by(model.created_at, model.id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for row in rows:
+                item = dict(row._mapping)
+                if prepare_row:
+                    item = await prepare_row(item)
+                yield json.dumps(item, default=_json_default) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def message_counts_subquery(user_id: int):
+    """Subquery of (conversation_id, message_count) for a user's conversations."""
+    return select(
+        Message.conversation_id, func.count(Message.id).label("message_count")
+    ).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).where(
+        Conversation.user_id == user_id
+    ).group_by(Message.conversation_id).subquery()
+
+async def build_chat_request(db: AsyncSession, user_id: int, conversation_id: int, content: str) -> ChatCompletionRequest:
+    """Build the personalized chat request for a new user message."""
+    # Create personalized prompt
+    system_prompt = await create_personalized_prompt(db, user_id, conversation_id)
+    prefix = await get_prompt_prefix(db, user_id)
+    
+    # Format messages for OpenAI
+    chat_messages = [
+        ChatMessage(role="system", content=system_prompt)
+    ]
+    
+    # Add recent conversation history (last 5 messages); the new message is already saved, so leave it out here
+    history = await get_conversation_history(db, conversation_id, limit=6)
+    if history and history[-1]["sender"] == "user" and history[-1]["content"] == content:
+        history.pop()
+    for hist_msg in history[-5:]:
+        role = "assistant" if hist_msg["sender"] == "ai" else "user"
+        chat_messages.append(ChatMessage(role=role, content=hist_msg["content"]))
+    
+    # Add current message
+    chat_messages.append(ChatMessage(role="user", content=content))
+    
+    return ChatCompletionRequest(
+        messages=chat_messages,
+        user_id=user_id,
+        conversation_id=conversation_id,
+        prompt_cache_key=prompt_cache.provider_key(prefix) if prefix else None
+    )
+
+def chat_model_input(request: ChatCompletionRequest) -> List[Tuple[str, str]]:
+    """Convert a chat request to the (role, content) messages the chat model accepts."""
+    return [(msg.role, msg.content) for msg in request.messages]
 
 if __name__ == "__main__":
     
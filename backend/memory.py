@@ -1,14 +1,16 @@
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 
-from .models import User, Conversation, Message
+from .models import User, UserProfile, Conversation, Message, UserMessageRollup
+from . import prompt_cache
 
-def get_conversation_history(db: Session, conversation_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+async def get_conversation_history(db: AsyncSession, conversation_id: int, limit: int = 20) -> List[Dict[str, Any]]:
     """Get the conversation history for a specific conversation."""
-    messages = db.query(Message).filter(
+    messages = (await db.scalars(select(Message).where(
         Message.conversation_id == conversation_id
-    ).order_by(Message.created_at.desc()).limit(limit).all()
+    ).order_by(Message.created_at.desc(), Message.id.desc()).limit(limit))).all()
     
     # Reverse to get chronological order
     messages.reverse()
@@ -22,11 +24,11 @@ def get_conversation_history(db: Session, conversation_id: int, limit: int = 20)
         "intent": msg.intent
     } for msg in messages]
 
-def get_user_conversation_summaries(db: Session, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+async def get_user_conversation_summaries(db: AsyncSession, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
     """Get summaries of a user's recent conversations."""
-    conversations = db.query(Conversation).filter(
+    conversations = (await db.scalars(select(Conversation).where(
         Conversation.user_id == user_id
-    ).order_by(Conversation.updated_at.desc()).limit(limit).all()
+    ).order_by(Conversation.updated_at.desc()).limit(limit))).all()
     
     return [{
         "id": conv.id,
@@ -37,64 +39,169 @@ def get_user_conversation_summaries(db: Session, user_id: int, limit: int = 5) -
         "sentiment": conv.sentiment
     } for conv in conversations]
 
-def get_user_message_patterns(db: Session, user_id: int, days: int = 30) -> Dict[str, Any]:
-    """Analyze patterns in a user's messages over a period of time."""
-    # Get time threshold
-    threshold = datetime.utcnow() - timedelta(days=days)
+def _message_day(created_at: Optional[datetime]):
+    """UTC day a message is bucketed under."""
+    if created_at is None:
+        return datetime.utcnow().date()
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+async def _add_to_rollup(db: AsyncSession, user_id: int, day, sentiment: Optional[str], intent: Optional[str], delta: int):
+    """Add delta to one rollup bucket, creating it if needed."""
+    values = {"user_id": user_id, "day": day, "sentiment": sentiment or "", "intent": intent or "", "message_count": delta}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # Upsert, so concurrent messages in the same bucket never collide on the unique key
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(UserMessageRollup).values(**values)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "day", "sentiment", "intent"],
+            set_={"message_count": UserMessageRollup.message_count + statement.excluded.message_count}
+        ))
+        return
     
-    # Get user's conversations
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == user_id,
-        Conversation.created_at >= threshold
-    ).all()
-    
-    # Get all messages from these conversations
-    all_messages = []
-    for conv in conversations:
-        messages = db.query(Message).filter(
-            Message.conversation_id == conv.id,
-            Message.sender == "user"
-        ).all()
-        all_messages.extend(messages)
-    
-    # Analyze sentiment distribution
+    result = await db.execute(update(UserMessageRollup).where(
+        UserMessageRollup.user_id == user_id,
+        UserMessageRollup.day == day,
+        UserMessageRollup.sentiment == values["sentiment"],
+        UserMessageRollup.intent == values["intent"]
+    ).values(message_count=UserMessageRollup.message_count + delta).execution_options(synchronize_session=False))
+    if not result.rowcount:
+        db.add(UserMessageRollup(**values))
+
+async def record_user_message(db: AsyncSession, user_id: int, sentiment: Optional[str], intent: Optional[str]):
+    """Count a new user message in its rollup bucket; call before committing the Message insert."""
+    await _add_to_rollup(db, user_id, datetime.utcnow().date(), sentiment, intent, 1)
+
+async def remove_conversation_from_rollups(db: AsyncSession, conversation_id: int):
+    """Subtract a conversation's user messages from the rollups; call before deleting them."""
+    conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id))
+    if not conversation:
+        return
+    buckets = {}
+    rows = await db.execute(select(Message.created_at, Message.sentiment, Message.intent).where(
+        Message.conversation_id == conversation_id, Message.sender == "user"
+    ))
+    for created_at, sentiment, intent in rows:
+        key = (_message_day(created_at), sentiment, intent)
+        buckets[key] = buckets.get(key, 0) + 1
+    for (day, sentiment, intent), count in buckets.items():
+        await _add_to_rollup(db, conversation.user_id, day, sentiment, intent, -count)
+    await db.execute(delete(UserMessageRollup).where(
+        UserMessageRollup.user_id == conversation.user_id, UserMessageRollup.message_count <= 0
+    ).execution_options(synchronize_session=False))
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """Recount every rollup bucket from the messages table; returns the number of buckets."""
+    await db.execute(delete(UserMessageRollup).execution_options(synchronize_session=False))
+    buckets = {}
+    rows = await db.stream(select(Conversation.user_id, Message.created_at, Message.sentiment, Message.intent).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).where(Message.sender == "user").execution_options(yield_per=1000))
+    async for user_id, created_at, sentiment, intent in rows:
+        key = (user_id, _message_day(created_at), sentiment or "", intent or "")
+        buckets[key] = buckets.get(key, 0) + 1
+    db.add_all([
+        UserMessageRollup(user_id=user_id, day=day, sentiment=sentiment, intent=intent, message_count=count)
+        for (user_id, day, sentiment, intent), count in buckets.items()
+    ])
+    await db.commit()
+    prompt_cache.clear()
+    return len(buckets)
+
+async def rollups_need_backfill(db: AsyncSession) -> bool:
+    """Whether user messages exist that predate the rollup table."""
+    if await db.scalar(select(UserMessageRollup.id).limit(1)) is not None:
+        return False
+    return await db.scalar(select(Message.id).where(Message.sender == "user").limit(1)) is not None
+
+def _summarize_patterns(buckets, conversation_count: int, days: int) -> Dict[str, Any]:
+    """Build the patterns dict from (sentiment, intent, count) rows."""
+    message_count = 0
     sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for msg in all_messages:
-        if msg.sentiment:
-            sentiment_counts[msg.sentiment] = sentiment_counts.get(msg.sentiment, 0) + 1
-    
-    # Analyze intent distribution
     intent_counts = {}
-    for msg in all_messages:
-        if msg.intent:
-            intent_counts[msg.intent] = intent_counts.get(msg.intent, 0) + 1
+    for sentiment, intent, count in buckets:
+        message_count += count
+        if sentiment:
+            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + count
+        if intent:
+            intent_counts[intent] = intent_counts.get(intent, 0) + count
     
     # Get top intents
-    top_intents = sorted(intent_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_intents = sorted(intent_counts.items(), key=lambda x: (-x[1], x[0]))[:5]
     
     return {
-        "message_count": len(all_messages),
-        "conversation_count": len(conversations),
+        "message_count": message_count,
+        "conversation_count": conversation_count,
         "sentiment_distribution": sentiment_counts,
         "top_intents": dict(top_intents),
         "time_period_days": days
     }
 
-def create_memory_context(db: Session, user_id: int, current_conversation_id: Optional[int] = None) -> str:
-    """Create a memory context string for the AI based on user history."""
-    # Get user profile
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return ""
+def _conversation_count_since(user_id: int, threshold: datetime):
+    """Scalar subquery counting the user's conversations created since the threshold."""
+    return select(func.count(Conversation.id)).where(
+        Conversation.user_id == user_id,
+        Conversation.created_at >= threshold
+    ).scalar_subquery()
+
+async def get_user_message_patterns(db: AsyncSession, user_id: int, days: int = 30) -> Dict[str, Any]:
+    """Analyze patterns in a user's messages over a period of time, read from the per-day rollups."""
+    threshold = datetime.utcnow() - timedelta(days=days)
+    
+    # Sum the buckets in the window; cost depends on distinct buckets, not on message history
+    buckets = (await db.execute(select(
+        UserMessageRollup.sentiment, UserMessageRollup.intent, func.sum(UserMessageRollup.message_count)
+    ).where(
+        UserMessageRollup.user_id == user_id,
+        UserMessageRollup.day >= threshold.date()
+    ).group_by(UserMessageRollup.sentiment, UserMessageRollup.intent))).all()
+    
+    conversation_count = await db.scalar(select(_conversation_count_since(user_id, threshold)))
     
+    return _summarize_patterns(buckets, conversation_count, days)
+
+async def scan_user_message_patterns(db: AsyncSession, user_id: int, days: int = 30) -> Dict[str, Any]:
+    """Analyze patterns by reading the messages themselves; used to check the rollups."""
+    # Get time threshold; messages are counted from the start of the threshold's day, like the rollups
+    threshold = datetime.utcnow() - timedelta(days=days)
+    day_start = datetime.combine(threshold.date(), datetime.min.time())
+    
+    # One grouped query over the user's messages, with the conversation count as a scalar subquery,
+    # so the statement count does not grow with the number of conversations
+    rows = (await db.execute(select(
+        Message.sentiment,
+        Message.intent,
+        func.count(Message.id),
+        _conversation_count_since(user_id, threshold)
+    ).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).where(
+        Conversation.user_id == user_id,
+        Message.sender == "user",
+        Message.created_at >= day_start
+    ).group_by(Message.sentiment, Message.intent))).all()
+    
+    if rows:
+        conversation_count = rows[0][3]
+    else:
+        conversation_count = await db.scalar(select(_conversation_count_since(user_id, threshold)))
+    
+    return _summarize_patterns([row[:3] for row in rows], conversation_count, days)
+
+def user_context_lines(user: User, profile: Optional[UserProfile]) -> List[str]:
+    """Context lines describing the user and their profile."""
     context_parts = []
     
     # Add basic user info
     context_parts.append(f"User: {user.name} (Role: {user.role})")
     
-    # Add user profile if available
-    if hasattr(user, 'user_profile') and user.user_profile:
-        profile = user.user_profile
+    # Add user profile if available; it is passed in because relationships cannot lazy-load under asyncio
+    if profile:
         profile_info = []
         if profile.age:
             profile_info.append(f"Age: {profile.age}")
@@ -108,8 +215,11 @@ def create_memory_context(db: Session, user_id: int, current_conversation_id: Op
         if profile_info:
             context_parts.append("User profile: " + ", ".join(profile_info))
     
-    # Add message patterns
-    patterns = get_user_message_patterns(db, user_id, days=30)
+    return context_parts
+
+def pattern_context_lines(patterns: Dict[str, Any]) -> List[str]:
+    """Context lines describing the user's recent message patterns."""
+    context_parts = []
     if patterns["message_count"] > 0:
         # Add sentiment trends
         sentiments = patterns["sentiment_distribution"]
@@ -121,14 +231,20 @@ def create_memory_context(db: Session, user_id: int, current_conversation_id: Op
             top_intent = list(patterns["top_intents"].keys())[0] if patterns["top_intents"] else "general conversation"
             context_parts.append(f"Common conversation focus: {top_intent}")
     
+    return context_parts
+
+async def conversation_context_lines(db: AsyncSession, user_id: int, current_conversation_id: Optional[int] = None) -> List[str]:
+    """Context lines with the current and recent conversation summaries."""
+    context_parts = []
+    
     # Add current conversation context if available
     if current_conversation_id:
-        conversation = db.query(Conversation).filter(Conversation.id == current_conversation_id).first()
+        conversation = await db.scalar(select(Conversation).where(Conversation.id == current_conversation_id))
         if conversation and conversation.summary:
             context_parts.append(f"Current conversation summary: {conversation.summary}")
     
     # Add recent conversation summaries
-    recent_conversations = get_user_conversation_summaries(db, user_id, limit=3)
+    recent_conversations = await get_user_conversation_summaries(db, user_id, limit=3)
     if recent_conversations and len(recent_conversations) > 0:
         summaries = []
         for i, conv in enumerate(recent_conversations):
@@ -138,4 +254,23 @@ def create_memory_context(db: Session, user_id: int, current_conversation_id: Op
         if summaries:
             context_parts.append("Recent conversation history: " + " ".join(summaries))
     
+    return context_parts
+
+async def create_memory_context(db: AsyncSession, user_id: int, current_conversation_id: Optional[int] = None, patterns: Optional[Dict[str, Any]] = None) -> str:
+    """Create a memory context string for the AI based on user history; pass patterns to reuse ones already loaded."""
+    # Get user profile
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if not user:
+        return ""
+    profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+    
+    context_parts = user_context_lines(user, profile)
+    
+    # Add message patterns
+    if patterns is None:
+        patterns = await get_user_message_patterns(db, user_id, days=30)
+    context_parts.extend(pattern_context_lines(patterns))
+    
+    context_parts.extend(await conversation_context_lines(db, user_id, current_conversation_id))
+    
     return "\n".join(context_parts)
@@ -0,0 +1,43 @@
+from typing import Dict, Any
+from collections import deque
+import threading
+
+# Recent samples kept per timing; percentiles are computed over this window
+WINDOW_SIZE = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_timings: Dict[str, Dict[str, Any]] = {}
+
+def increment(name: str, amount: int = 1):
+    """Add to a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def observe(name: str, seconds: float):
+    """Record one sample of a named timing."""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {"count": 0, "samples": deque(maxlen=WINDOW_SIZE)}
+        timing["count"] += 1
+        timing["samples"].append(seconds)
+
+def _percentile(ordered, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def snapshot() -> Dict[str, Any]:
+    """Return all counters and timing percentiles (in milliseconds)."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {name: (timing["count"], sorted(timing["samples"])) for name, timing in _timings.items()}
+
+    report = {}
+    for name, (count, ordered) in timings.items():
+        report[name] = {
+            "count": count,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    return {"counters": counters, "timings": report}
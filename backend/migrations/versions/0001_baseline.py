@@ -0,0 +1,106 @@
+"""Baseline schema
+
+Databases created before migrations existed already have these tables (from create_all),
+so each table is only created when it is missing; such databases are simply stamped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(name, *columns, indexes=()):
+    if sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    op.create_index(f"ix_{name}_id", name, ["id"])
+    for column, unique in indexes:
+        op.create_index(f"ix_{name}_{column}", name, [column], unique=unique)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String()),
+        sa.Column("name", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("role", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("preferences", sa.JSON(), nullable=True),
+        indexes=[("email", True)],
+    )
+    _create_table(
+        "user_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), unique=True),
+        sa.Column("age", sa.Integer(), nullable=True),
+        sa.Column("gender", sa.String(), nullable=True),
+        sa.Column("mental_health_history", sa.Text(), nullable=True),
+        sa.Column("therapy_goals", sa.Text(), nullable=True),
+        sa.Column("communication_style", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    _create_table(
+        "conversations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("summary", sa.Text(), nullable=True),
+        sa.Column("sentiment", sa.String(), nullable=True),
+    )
+    _create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content", sa.Text()),
+        sa.Column("sender", sa.String()),
+        sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("sentiment", sa.String(), nullable=True),
+        sa.Column("intent", sa.String(), nullable=True),
+        sa.Column("message_metadata", sa.JSON(), nullable=True),
+    )
+    _create_table(
+        "documents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("content", sa.Text()),
+        sa.Column("context_notes", sa.Text(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("document_type", sa.String(), nullable=True),
+        sa.Column("embedding_status", sa.String(), nullable=True),
+        sa.Column("chunk_count", sa.Integer(), nullable=True),
+    )
+    _create_table(
+        "document_chunks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id")),
+        sa.Column("content", sa.Text()),
+        sa.Column("chunk_index", sa.Integer()),
+        sa.Column("embedding_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in ("document_chunks", "documents", "messages", "conversations", "user_profiles", "users"):
+        op.drop_table(name)
@@ -0,0 +1,60 @@
+"""Document processing stats, user message rollups and never-reused chunk IDs
+
+Each step checks the live schema first, because databases created with create_all may
+already have it.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "processing_stats" not in {column["name"] for column in inspector.get_columns("documents")}:
+        op.add_column("documents", sa.Column("processing_stats", sa.JSON(), nullable=True))
+
+    if not inspector.has_table("user_message_rollups"):
+        op.create_table(
+            "user_message_rollups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("day", sa.Date()),
+            sa.Column("sentiment", sa.String()),
+            sa.Column("intent", sa.String()),
+            sa.Column("message_count", sa.Integer()),
+            sa.UniqueConstraint("user_id", "day", "sentiment", "intent", name="uq_user_message_rollup_bucket"),
+        )
+        op.create_index("ix_user_message_rollups_id", "user_message_rollups", ["id"])
+        op.create_index("ix_user_message_rollups_user_id", "user_message_rollups", ["user_id"])
+
+    # Chunk IDs double as vector IDs, so SQLite must not hand out the ID of a deleted chunk again
+    if bind.dialect.name == "sqlite":
+        table_sql = bind.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'document_chunks'"
+        ).scalar()
+        if "AUTOINCREMENT" not in table_sql.upper():
+            with op.batch_alter_table("document_chunks", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+                pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_message_rollups")
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("processing_stats")
@@ -0,0 +1,57 @@
+"""Composite indexes for the hot message, conversation and chunk queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    # Conversation history and message pages: WHERE conversation_id = ? ORDER BY created_at
+    ("ix_messages_conversation_id_created_at", "messages", ["conversation_id", "created_at"]),
+    # A conversation's user messages: WHERE conversation_id = ? AND sender = 'user'
+    ("ix_messages_conversation_id_sender", "messages", ["conversation_id", "sender"]),
+    # Recent conversation summaries: WHERE user_id = ? ORDER BY updated_at DESC
+    ("ix_conversations_user_id_updated_at", "conversations", ["user_id", "updated_at"]),
+    # Conversation pages and pattern windows: WHERE user_id = ? [AND created_at >= ?] ORDER BY created_at
+    ("ix_conversations_user_id_created_at", "conversations", ["user_id", "created_at"]),
+    # Re-ingesting or deleting a document: WHERE document_id = ?
+    ("ix_document_chunks_document_id", "document_chunks", ["document_id"]),
+]
+
+# Single-column indexes create_all may have added; the composites above lead with the same column
+SUPERSEDED = [
+    ("ix_messages_conversation_id", "messages"),
+    ("ix_conversations_user_id", "conversations"),
+]
+
+
+def _index_names(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        if name not in _index_names(table):
+            op.create_index(name, table, columns)
+    for name, table in SUPERSEDED:
+        if name in _index_names(table):
+            op.drop_index(name, table_name=table)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,58 @@
+"""Rolling conversation summaries: summary cursor and sentiment counters
+
+Conversations that already have a summary are marked as summarized up to their latest
+message, with counters for the sentiments seen so far, so the next update only folds in
+newer messages.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = {"positive_count": "positive", "neutral_count": "neutral", "negative_count": "negative"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("conversations")}
+
+    with op.batch_alter_table("conversations") as batch_op:
+        if "summary_message_id" not in columns:
+            batch_op.add_column(sa.Column("summary_message_id", sa.Integer(), nullable=True))
+        for name in COUNTERS:
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute(
+        "UPDATE conversations SET summary_message_id = "
+        "(SELECT MAX(messages.id) FROM messages WHERE messages.conversation_id = conversations.id) "
+        "WHERE summary IS NOT NULL AND summary_message_id IS NULL"
+    )
+    for name, sentiment in COUNTERS.items():
+        op.execute(
+            f"UPDATE conversations SET {name} = "
+            "(SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id "
+            f"AND messages.sender = 'user' AND messages.sentiment = '{sentiment}' "
+            "AND messages.id <= conversations.summary_message_id) "
+            "WHERE summary_message_id IS NOT NULL"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("conversations") as batch_op:
+        for name in reversed(list(COUNTERS)):
+            batch_op.drop_column(name)
+        batch_op.drop_column("summary_message_id")
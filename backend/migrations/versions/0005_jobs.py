@@ -0,0 +1,78 @@
+"""Job queue for the background worker
+
+Documents left in "processing" by background tasks that died with their web worker are
+queued for ingestion again.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Matches jobs.PROCESS_DOCUMENT and its priority; the queue module is not imported into migrations
+PROCESS_DOCUMENT = "process_document"
+PROCESS_DOCUMENT_PRIORITY = 10
+MAX_ATTEMPTS = 5
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("jobs"):
+        return
+
+    jobs = op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String()),
+        sa.Column("payload", sa.JSON()),
+        sa.Column("priority", sa.Integer()),
+        sa.Column("status", sa.String()),
+        sa.Column("attempts", sa.Integer()),
+        sa.Column("max_attempts", sa.Integer()),
+        sa.Column("dedupe_key", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True)),
+        sa.Column("run_at", sa.DateTime(timezone=True)),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("worker_id", sa.String(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_jobs_id", "jobs", ["id"])
+    op.create_index("ix_jobs_status_priority_run_at", "jobs", ["status", "priority", "run_at"])
+    op.create_index("ix_jobs_dedupe_key_status", "jobs", ["dedupe_key", "status"])
+    op.create_index("ix_jobs_status_finished_at", "jobs", ["status", "finished_at"])
+
+    documents = op.get_bind().execute(sa.text("SELECT id FROM documents WHERE status = 'processing'")).fetchall()
+    now = datetime.now(timezone.utc)
+    op.bulk_insert(jobs, [
+        {
+            "kind": PROCESS_DOCUMENT,
+            "payload": {"document_id": document_id},
+            "priority": PROCESS_DOCUMENT_PRIORITY,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": MAX_ATTEMPTS,
+            "dedupe_key": f"document:{document_id}",
+            "created_at": now,
+            "run_at": now,
+        }
+        for document_id, in documents
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("jobs")
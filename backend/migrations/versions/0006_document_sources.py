@@ -0,0 +1,36 @@
+"""Uploaded documents are read from a spooled file instead of the content column
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("documents")}
+
+    with op.batch_alter_table("documents") as batch_op:
+        if "source_path" not in columns:
+            batch_op.add_column(sa.Column("source_path", sa.String(), nullable=True))
+        if "source_encoding" not in columns:
+            batch_op.add_column(sa.Column("source_encoding", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("source_encoding")
+        batch_op.drop_column("source_path")
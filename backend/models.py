@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Date, Boolean, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -36,6 +36,10 @@ class UserProfile(Base):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_user_id_updated_at", "user_id", "updated_at"),  # Recent conversation summaries
+        Index("ix_conversations_user_id_created_at", "user_id", "created_at"),  # Listing pages, pattern windows
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
@@ -44,6 +48,11 @@ class Conversation(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     summary = Column(Text, nullable=True)  # AI-generated summary of the conversation
     sentiment = Column(String, nullable=True)  # Overall sentiment of the conversation
+    summary_message_id = Column(Integer, nullable=True)  # Last message folded into the summary
+    # Sentiments of the user messages folded into the summary, for the overall sentiment
+    positive_count = Column(Integer, nullable=False, default=0, server_default="0")
+    neutral_count = Column(Integer, nullable=False, default=0, server_default="0")
+    negative_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     user = relationship("User", back_populates="conversations")
@@ -51,6 +60,10 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),  # History and listing pages
+        Index("ix_messages_conversation_id_sender", "conversation_id", "sender"),  # A conversation's user messages
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
@@ -64,12 +77,26 @@ class Message(Base):
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
 
+class UserMessageRollup(Base):
+    __tablename__ = "user_message_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "day", "sentiment", "intent", name="uq_user_message_rollup_bucket"),)
+    
+    # One row per user, UTC day, sentiment and intent, counting that user's messages
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    day = Column(Date)
+    sentiment = Column(String, default="")  # "" rather than NULL so the unique bucket key holds
+    intent = Column(String, default="")
+    message_count = Column(Integer, default=0)
+
 class Document(Base):
     __tablename__ = "documents"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    content = Column(Text)  # This could be the text content or a file path
+    content = Column(Text)  # Text content of documents added as text; None for uploaded files
+    source_path = Column(String, nullable=True)  # Spooled upload the text is read from
+    source_encoding = Column(String, nullable=True)  # Text encoding of the spooled upload
     context_notes = Column(Text, nullable=True)  # Admin notes about the document
     status = Column(String)  # "processing", "completed", "failed"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -77,12 +104,14 @@ class Document(Base):
     document_type = Column(String, nullable=True)  # e.g., "therapy_guide", "mental_health_resource"
     embedding_status = Column(String, nullable=True)  # "pending", "completed", "failed"
     chunk_count = Column(Integer, nullable=True)  # Number of chunks this document was split into
+    processing_stats = Column(JSON, nullable=True)  # Per-stage ingestion timings from the last processing run
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = {"sqlite_autoincrement": True}  # Chunk IDs double as vector IDs and must never be reused
     
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"))
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
     content = Column(Text)
     chunk_index = Column(Integer)
     embedding_id = Column(String, nullable=True)  # ID to reference in the vector store
@@ -90,3 +119,28 @@ class DocumentChunk(Base):
     
     # Relationships
     document = relationship("Document")
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_priority_run_at", "status", "priority", "run_at"),  # Claiming the next ready jobs
+        Index("ix_jobs_dedupe_key_status", "dedupe_key", "status"),  # A key's job still waiting to run
+        Index("ix_jobs_status_finished_at", "status", "finished_at"),  # Recent latencies, purging old jobs
+    )
+    
+    # Background work run by the worker process; timestamps are set by the queue, in UTC
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # e.g. "process_document", "update_conversation_summary"
+    payload = Column(JSON)
+    priority = Column(Integer, default=0)  # Lower runs first
+    status = Column(String, default="queued")  # "queued", "running", "completed", "failed"
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer)
+    dedupe_key = Column(String, nullable=True)  # At most one waiting job per key
+    created_at = Column(DateTime(timezone=True))
+    run_at = Column(DateTime(timezone=True))  # Not claimed before this; pushed back by debouncing and retries
+    started_at = Column(DateTime(timezone=True), nullable=True)  # Start of the latest attempt
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    worker_id = Column(String, nullable=True)  # Worker holding the lease
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # Requeued after this unless renewed
+    last_error = Column(Text, nullable=True)
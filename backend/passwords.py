@@ -0,0 +1,76 @@
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+from . import metrics
+
+load_dotenv()
+
+# bcrypt work factor; hashes made with another factor are upgraded on the user's next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes that hash and verify passwords, so bcrypt never runs on the event loop;
+# 0 hashes on the default thread pool instead
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+def hash_password(password: str) -> str:
+    """Hash a password at the configured work factor; blocks for the whole bcrypt run."""
+    return pwd_context.hash(password)
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; also returns a new hash when the stored one uses another work factor."""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+def _ready(_=None) -> int:
+    return os.getpid()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawned rather than forked, so workers never inherit the server's threads or event loop
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def start_workers():
+    """Start the worker processes, so the first logins do not pay for spawning them."""
+    if PASSWORD_HASH_WORKERS > 0:
+        list(_get_executor().map(_ready, range(PASSWORD_HASH_WORKERS)))
+
+def shutdown():
+    """Stop the worker processes."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def _run(name: str, function, *args):
+    started = time.perf_counter()
+    if PASSWORD_HASH_WORKERS > 0:
+        result = await asyncio.get_running_loop().run_in_executor(_get_executor(), function, *args)
+    else:
+        result = await asyncio.to_thread(function, *args)
+    metrics.observe(name, time.perf_counter() - started)
+    return result
+
+async def ahash_password(password: str) -> str:
+    """Hash a password off the event loop."""
+    return await _run("password_hash", hash_password, password)
+
+async def averify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop; see verify_and_update."""
+    return await _run("password_verify", verify_and_update, password, hashed_password)
@@ -1,37 +1,45 @@
 from typing import Dict, Any, List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from .models import User, UserProfile, Conversation, Message
-from .memory import get_user_message_patterns, create_memory_context
+from .memory import get_user_message_patterns, user_context_lines, pattern_context_lines, conversation_context_lines
+from . import prompt_cache
+from . import principal_cache
 
-def get_or_create_user_profile(db: Session, user_id: int) -> UserProfile:
+async def get_or_create_user_profile(db: AsyncSession, user_id: int) -> UserProfile:
     """Get or create a user profile."""
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
     if not profile:
         profile = UserProfile(user_id=user_id)
         db.add(profile)
-        db.commit()
-        db.refresh(profile)
+        await db.commit()
+        await db.refresh(profile)
+        prompt_cache.bump(prompt_cache.PROFILE, user_id)
+        principal_cache.invalidate(user_id)
     return profile
 
-def update_user_profile(db: Session, user_id: int, profile_data: Dict[str, Any]) -> UserProfile:
+async def update_user_profile(db: AsyncSession, user_id: int, profile_data: Dict[str, Any]) -> UserProfile:
     """Update a user's profile with new data."""
-    profile = get_or_create_user_profile(db, user_id)
+    profile = await get_or_create_user_profile(db, user_id)
     
     # Update fields
     for key, value in profile_data.items():
         if hasattr(profile, key):
             setattr(profile, key, value)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
+    prompt_cache.bump(prompt_cache.PROFILE, user_id)
+    principal_cache.invalidate(user_id)
     return profile
 
-def infer_user_preferences(db: Session, user_id: int) -> Dict[str, Any]:
-    """Infer user preferences based on their conversation history."""
+async def infer_user_preferences(db: AsyncSession, user_id: int, patterns: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Infer user preferences based on their conversation history; pass patterns to reuse ones already loaded."""
     # Get message patterns
-    patterns = get_user_message_patterns(db, user_id)
+    if patterns is None:
+        patterns = await get_user_message_patterns(db, user_id)
     
     # Default preferences
     preferences = {
@@ -57,44 +65,83 @@ def infer_user_preferences(db: Session, user_id: int) -> Dict[str, Any]:
     
     return preferences
 
-def create_personalized_prompt(db: Session, user_id: int, conversation_id: Optional[int] = None) -> str:
-    """Create a personalized system prompt for the AI based on user profile and history."""
+async def _build_prompt_prefix(db: AsyncSession, user_id: int) -> Optional[str]:
     # Get user and profile
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
-        return get_default_system_prompt()
+        return None
     
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
     
     # Start with base prompt
     prompt = get_default_system_prompt()
-    
-    # Add memory context
-    memory_context = create_memory_context(db, user_id, conversation_id)
-    if memory_context:
-        prompt += "\n\nUser Context:\n" + memory_context
+    prompt += "\n\nUser Context:\n" + "\n".join(user_context_lines(user, profile))
     
     # Add personalization based on profile
     if profile:
-        prompt += "\n\nPersonalization Guidelines:\n"
+        guidelines = []
         
         if profile.communication_style:
-            prompt += f"- Use a {profile.communication_style} communication style\n"
+            guidelines.append(f"- Use a {profile.communication_style} communication style")
         
         if profile.therapy_goals:
-            prompt += f"- Focus on helping with: {profile.therapy_goals}\n"
+            guidelines.append(f"- Focus on helping with: {profile.therapy_goals}")
+        
+        if guidelines:
+            prompt += "\n\nPersonalization Guidelines:\n" + "\n".join(guidelines)
     
-    # Add inferred preferences
-    preferences = infer_user_preferences(db, user_id)
+    return prompt
+
+async def get_prompt_prefix(db: AsyncSession, user_id: int) -> Optional[str]:
+    """Get the part of a user's system prompt that only changes with their profile, or None if the user does not exist."""
+    return await prompt_cache.get_or_build(
+        "prefix", (prompt_cache.PROFILE,), user_id, None, lambda: _build_prompt_prefix(db, user_id)
+    )
+
+async def _build_pattern_section(db: AsyncSession, user_id: int) -> List[str]:
+    # Message patterns feed both the context lines and the inferred preferences, so load them once
+    patterns = await get_user_message_patterns(db, user_id, days=30)
+    profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+    
+    guidelines = []
+    preferences = await infer_user_preferences(db, user_id, patterns=patterns)
     if preferences:
         if "communication_style" in preferences and not (profile and profile.communication_style):
-            prompt += f"- Adapt a {preferences['communication_style']} tone\n"
+            guidelines.append(f"- Adapt a {preferences['communication_style']} tone")
         
         if "response_length" in preferences:
-            prompt += f"- Provide {preferences['response_length']} length responses\n"
+            guidelines.append(f"- Provide {preferences['response_length']} length responses")
         
         if "formality_level" in preferences:
-            prompt += f"- Maintain a {preferences['formality_level']} level of formality\n"
+            guidelines.append(f"- Maintain a {preferences['formality_level']} level of formality")
+    
+    return [pattern_context_lines(patterns), guidelines]
+
+async def create_personalized_prompt(db: AsyncSession, user_id: int, conversation_id: Optional[int] = None) -> str:
+    """Create a personalized system prompt for the AI based on user profile and history."""
+    # The profile-only prefix comes first and stays byte-identical between turns, so provider-side
+    # prompt caching can reuse it; sections that change as the user chats follow it
+    prompt = await get_prompt_prefix(db, user_id)
+    if prompt is None:
+        return get_default_system_prompt()
+    
+    conversation_lines = await prompt_cache.get_or_build(
+        "conversations", (prompt_cache.SUMMARY,), user_id, conversation_id,
+        lambda: conversation_context_lines(db, user_id, conversation_id)
+    )
+    pattern_lines, guidelines = await prompt_cache.get_or_build(
+        "patterns", (prompt_cache.ROLLUP, prompt_cache.PROFILE), user_id, None,
+        lambda: _build_pattern_section(db, user_id)
+    )
+    
+    # Add memory context
+    recent_activity = conversation_lines + pattern_lines
+    if recent_activity:
+        prompt += "\n\nRecent Activity:\n" + "\n".join(recent_activity)
+    
+    # Add inferred preferences
+    if guidelines:
+        prompt += "\n\nAdaptive Guidelines:\n" + "\n".join(guidelines)
     
     return prompt
 
@@ -116,10 +163,10 @@ def get_default_system_prompt() -> str:
     8. Be alert for signs of crisis and provide appropriate resources
     """
 
-def analyze_conversation_for_insights(db: Session, conversation_id: int) -> Dict[str, Any]:
+async def analyze_conversation_for_insights(db: AsyncSession, conversation_id: int) -> Dict[str, Any]:
     """Analyze a conversation to extract insights about the user."""
     # Get conversation messages
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).all()
+    messages = (await db.scalars(select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at))).all()
     
     # Extract user messages
     user_messages = [msg for msg in messages if msg.sender == "user"]
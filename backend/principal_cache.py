@@ -0,0 +1,101 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import os
+import hashlib
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# In-process cache of authenticated users, keyed by bearer token, so repeated requests skip the
+# JWT signature check and the users lookup. Writers bump a user's version after committing a
+# change to their role, preferences or profile, which retires every cached token for that user.
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() == "true"
+# Bounds staleness when several worker processes each hold their own versions, and for changes
+# made outside the API (e.g. a role updated directly in the database)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # Seconds
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+_versions: Dict[int, int] = {}
+# Bumped by every invalidation; entries loaded across one are not stored
+_generation = 0
+# Entries in least recently used order, keyed by token digest: (user ID, user version, expires at, user columns)
+_entries: "OrderedDict[str, Tuple[int, int, float, Dict[str, Any]]]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "expired": 0, "stale": 0, "evicted": 0, "invalidated": 0}
+
+def _key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def generation() -> int:
+    """Invalidation counter; read it before loading a user and pass it to store()."""
+    with _lock:
+        return _generation
+
+def lookup(token: str) -> Optional[Dict[str, Any]]:
+    """Return the cached user columns for a token, or None."""
+    if not PRINCIPAL_CACHE_ENABLED:
+        return None
+
+    key = _key(token)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _counters["misses"] += 1
+            return None
+        user_id, user_version, expires_at, values = entry
+        if now >= expires_at or user_version != _versions.get(user_id, 0):
+            del _entries[key]
+            _counters["expired" if now >= expires_at else "stale"] += 1
+            _counters["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters["hits"] += 1
+        return values
+
+def store(token: str, user_id: int, loaded_generation: int, values: Dict[str, Any], token_expires_at: Optional[float] = None):
+    """Cache a verified token's user; the entry never outlives the token itself."""
+    if not PRINCIPAL_CACHE_ENABLED:
+        return
+
+    expires_at = time.time() + PRINCIPAL_CACHE_TTL
+    if token_expires_at is not None:
+        expires_at = min(expires_at, token_expires_at)
+    with _lock:
+        # A change committed while the user was loading may not be in the loaded row
+        if loaded_generation != _generation:
+            return
+        key = _key(token)
+        _entries[key] = (user_id, _versions.get(user_id, 0), expires_at, values)
+        _entries.move_to_end(key)
+        while len(_entries) > PRINCIPAL_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _counters["evicted"] += 1
+
+def invalidate(user_id: int):
+    """Retire every cached token of a user; call after committing a change to them."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        _counters["invalidated"] += 1
+
+def clear():
+    """Drop every cached principal."""
+    with _lock:
+        _entries.clear()
+
+def stats() -> Dict[str, Any]:
+    """Report hit/miss counters."""
+    with _lock:
+        lookups = _counters["hits"] + _counters["misses"]
+        return {
+            "enabled": PRINCIPAL_CACHE_ENABLED,
+            "entries": len(_entries),
+            "max_entries": PRINCIPAL_CACHE_MAX_ENTRIES,
+            "ttl_seconds": PRINCIPAL_CACHE_TTL,
+            **_counters,
+            "hit_rate": round(_counters["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,89 @@
+from typing import Dict, Any, Awaitable, Callable, Tuple
+from collections import OrderedDict
+import os
+import hashlib
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# In-process cache of personalized system prompt sections. Each section records the versions of
+# the inputs it was built from; writers bump a version after committing, which retires the section.
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Bounds staleness when several worker processes each hold their own versions
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "300"))  # Seconds
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "10000"))
+
+# Inputs a section can depend on, each versioned per user
+PROFILE = "profile"  # User and UserProfile rows
+SUMMARY = "summary"  # Conversation summaries
+ROLLUP = "rollup"  # User message rollups
+
+_versions: Dict[Tuple[str, int], int] = {}
+# Sections in least recently used order, keyed by (section, user ID, scope)
+_entries: "OrderedDict[Tuple[str, int, Any], Tuple[Tuple[int, ...], float, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+_sections: Dict[str, Dict[str, int]] = {}
+
+def bump(kind: str, user_id: int):
+    """Mark one input of a user's prompts as changed; call after the change is committed."""
+    with _lock:
+        _versions[(kind, user_id)] = _versions.get((kind, user_id), 0) + 1
+
+async def get_or_build(section: str, depends_on: Tuple[str, ...], user_id: int, scope: Any, build: Callable[[], Awaitable[Any]]) -> Any:
+    """Return a cached section if none of its inputs changed since it was built, else build and cache it."""
+    if not PROMPT_CACHE_ENABLED:
+        return await build()
+
+    key = (section, user_id, scope)
+    now = time.time()
+    with _lock:
+        # Versions are read before building, so a change committed meanwhile retires the new entry
+        versions = tuple(_versions.get((kind, user_id), 0) for kind in depends_on)
+        counters = _sections.setdefault(section, {"hits": 0, "misses": 0})
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == versions:
+            if now - entry[1] <= PROMPT_CACHE_TTL:
+                _entries.move_to_end(key)
+                _counters["hits"] += 1
+                counters["hits"] += 1
+                return entry[2]
+            _counters["expired"] += 1
+        _counters["misses"] += 1
+        counters["misses"] += 1
+
+    value = await build()
+    if value is None:
+        return value
+
+    with _lock:
+        _entries[key] = (versions, now, value)
+        _entries.move_to_end(key)
+        while len(_entries) > PROMPT_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _counters["evicted"] += 1
+    return value
+
+def provider_key(prefix: str) -> str:
+    """Key sent as the provider's prompt_cache_key, so requests sharing a prefix are routed together."""
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:32]
+
+def clear():
+    """Drop every cached section."""
+    with _lock:
+        _entries.clear()
+
+def stats() -> Dict[str, Any]:
+    """Report hit/miss counters overall and per section."""
+    with _lock:
+        lookups = _counters["hits"] + _counters["misses"]
+        return {
+            "enabled": PROMPT_CACHE_ENABLED,
+            "entries": len(_entries),
+            "max_entries": PROMPT_CACHE_MAX_ENTRIES,
+            **_counters,
+            "hit_rate": round(_counters["hits"] / lookups, 3) if lookups else None,
+            "sections": {name: dict(counters) for name, counters in _sections.items()},
+        }
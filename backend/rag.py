@@ -1,66 +1,83 @@
 from typing import List, Dict, Any, Optional, Tuple
 import os
-import json
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import faiss
 import numpy as np
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.documents import Document as LangchainDocument
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.runnables import RunnablePassthrough
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# LangChain takes seconds to import, so it is imported inside the functions that use it
 
 from .models import Document, DocumentChunk, User, UserProfile
-from .database import get_db
+from . import vector_store
+from . import llm_clients
+from . import embeddings
+from . import embedding_cache
+from . import answer_cache
+from . import prompt_cache
+from . import document_text
+from .classifier import INTENT_LABELS, normalize_intent
+from .vector_store import initialize_vector_store
 
 load_dotenv()
 
 # Initialize OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Vector database path
-VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./vector_db")
-
-# Ensure vector DB directory exists
-os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+# Ingestion tuning: texts per embedding request and embedding requests in flight
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# Chunks embedded, written and indexed together during ingestion; enough to keep every request slot busy
+INGEST_BATCH_CHUNKS = EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY
 
-# Initialize embeddings model
-embeddings_model = OpenAIEmbeddings()
+def get_embeddings_model():
+    """Get the configured embedding backend, creating it on first use."""
+    return embeddings.get_backend()
 
-# Initialize FAISS index
-index_dimension = 1536  # OpenAI embedding dimension
-index = None
-document_lookup = {}
+def embedding_model_name() -> str:
+    """Name of the embedding model, used to key cached vectors."""
+    return get_embeddings_model().name
 
-def initialize_vector_store():
-    """Initialize or load the FAISS vector store."""
-    global index, document_lookup
-    index_path = os.path.join(VECTOR_DB_PATH, "index.faiss")
-    lookup_path = os.path.join(VECTOR_DB_PATH, "document_lookup.json")
-    
-    if os.path.exists(index_path) and os.path.exists(lookup_path):
-        # Load existing index and lookup
-        index = faiss.read_index(index_path)
-        with open(lookup_path, 'r') as f:
-            document_lookup = json.load(f)
-    else:
-        # Create new index
-        index = faiss.IndexFlatL2(index_dimension)
-        document_lookup = {}
+def embed_texts(texts: List[str], backend: Optional[embeddings.EmbeddingBackend] = None) -> np.ndarray:
+    """Embed texts in batches, keeping up to EMBEDDING_CONCURRENCY requests in flight.
+    
+    Texts already in the embedding cache are not sent to the backend.
+    """
+    backend = backend or get_embeddings_model()
+    if not texts:
+        return np.zeros((0, backend.dimension), dtype=np.float32)
+    
+    model_name = backend.name
+    vectors = embedding_cache.get_many(model_name, texts)
+    
+    # Embed each distinct uncached text once
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        batches = [missing[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(missing), EMBEDDING_BATCH_SIZE)]
+        workers = max(1, min(EMBEDDING_CONCURRENCY, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() preserves batch order, so rows line up with the input texts
+            results = list(executor.map(backend.embed_documents, batches))
+        embedded = np.array([vector for batch in results for vector in batch], dtype=np.float32)
+        embedding_cache.put_many(model_name, missing, embedded)
+        by_text = dict(zip(missing, embedded))
+        vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    
+    return np.array(vectors, dtype=np.float32)
 
-def save_vector_store():
-    """Save the FAISS index and document lookup to disk."""
-    global index, document_lookup
-    index_path = os.path.join(VECTOR_DB_PATH, "index.faiss")
-    lookup_path = os.path.join(VECTOR_DB_PATH, "document_lookup.json")
-    
-    faiss.write_index(index, index_path)
-    with open(lookup_path, 'w') as f:
-        json.dump(document_lookup, f)
+async def embed_query(query: str) -> np.ndarray:
+    """Embed a search query, using the embedding cache when the same text was seen before."""
+    model_name = embedding_model_name()
+    cached = (await asyncio.to_thread(embedding_cache.get_many, model_name, [query]))[0]
+    if cached is not None:
+        return cached
+    
+    vector = np.array(await get_embeddings_model().aembed_query(query), dtype=np.float32)
+    await asyncio.to_thread(embedding_cache.put_many, model_name, [query], vector[np.newaxis, :])
+    return vector
 
 def process_document(db: Session, document_id: int) -> bool:
     """Process a document for RAG by splitting it into chunks and creating embeddings."""
@@ -69,108 +86,201 @@ def process_document(db: Session, document_id: int) -> bool:
     if not document:
         return False
     
+    timings = {}
+    started = time.perf_counter()
+    added_chunk_ids = []
     try:
         # Update document status
         document.status = "processing"
         document.embedding_status = "pending"
         db.commit()
         
-        # Split document into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-        chunks = text_splitter.split_text(document.content)
+        # Answers built from the previous content must not be served again
+        answer_cache.invalidate_documents([document.id])
         
-        # Create document chunks in database
-        db_chunks = []
-        for i, chunk_text in enumerate(chunks):
-            chunk = DocumentChunk(
-                document_id=document.id,
-                content=chunk_text,
-                chunk_index=i,
-            )
-            db.add(chunk)
-            db_chunks.append(chunk)
+        # Re-ingestion replaces the previous chunks and their vectors once the new ones are in
+        previous_chunk_ids = [row.id for row in db.query(DocumentChunk.id).filter(DocumentChunk.document_id == document.id)]
+        if previous_chunk_ids:
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
         
-        db.commit()
+        # Stream the text through the splitter, which runs a couple of batches ahead of embedding;
+        # large documents are split across processes
+        if document.source_path:
+            size = os.path.getsize(document.source_path)
+            blocks = document_text.iter_file_text(document.source_path, document.source_encoding)
+        else:
+            size = len(document.content or "")
+            blocks = [document.content or ""]
+        chunks = document_text.iter_chunks(document_text.iter_segments(blocks), parallel=size >= document_text.SPLIT_PARALLEL_MIN_BYTES)
+        batches = document_text.prefetch(document_text.batched(chunks, INGEST_BATCH_CHUNKS), depth=2)
         
-        # Create embeddings for each chunk
-        for chunk in db_chunks:
-            # Create embedding
-            embedding = embeddings_model.embed_query(chunk.content)
+        # Stage timings are summed over batches; split_seconds is only the time spent waiting on the splitter
+        for stage in ("split_seconds", "embed_seconds", "persist_seconds", "index_seconds"):
+            timings[stage] = 0.0
+        chunk_count = 0
+        # The index lock is held until the document's vectors are saved, when the block exits,
+        # so another process's index writes cannot overwrite them
+        with vector_store.writing():
+            stage_start = time.perf_counter()
+            for batch in batches:
+                timings["split_seconds"] += time.perf_counter() - stage_start
+                
+                stage_start = time.perf_counter()
+                vectors = embed_texts(batch)
+                timings["embed_seconds"] += time.perf_counter() - stage_start
+                
+                # One flush per batch assigns the primary keys; rows stay uncommitted until the end
+                stage_start = time.perf_counter()
+                db_chunks = [
+                    DocumentChunk(document_id=document.id, content=chunk_text, chunk_index=chunk_count + i)
+                    for i, chunk_text in enumerate(batch)
+                ]
+                db.add_all(db_chunks)
+                db.flush()
+                for chunk in db_chunks:
+                    chunk.embedding_id = f"doc_{document.id}_chunk_{chunk.id}"
+                db.flush()
+                chunk_ids = [chunk.id for chunk in db_chunks]
+                # Written chunks are not needed again, so the session does not hold every chunk's text
+                for chunk in db_chunks:
+                    db.expunge(chunk)
+                timings["persist_seconds"] += time.perf_counter() - stage_start
+                
+                stage_start = time.perf_counter()
+                vector_store.add_chunks(vectors, chunk_ids)
+                added_chunk_ids.extend(chunk_ids)
+                timings["index_seconds"] += time.perf_counter() - stage_start
+                
+                chunk_count += len(batch)
+                stage_start = time.perf_counter()
             
-            # Add to FAISS index
-            embedding_id = f"doc_{document.id}_chunk_{chunk.id}"
-            chunk.embedding_id = embedding_id
-            
-            # Add to index
-            index.add(np.array([embedding], dtype=np.float32))
-            
-            # Add to lookup
-            document_lookup[embedding_id] = {
-                "document_id": document.id,
-                "chunk_id": chunk.id,
-                "document_name": document.name,
-                "content": chunk.content,
-                "context_notes": document.context_notes,
-                "document_type": document.document_type
-            }
+            stage_start = time.perf_counter()
+            vector_store.remove_chunks(previous_chunk_ids)
+        timings["index_seconds"] += time.perf_counter() - stage_start
         
         # Update document status
+        timings["total_seconds"] = time.perf_counter() - started
         document.status = "completed"
         document.embedding_status = "completed"
-        document.chunk_count = len(chunks)
+        document.chunk_count = chunk_count
+        document.processing_stats = {
+            **timings,
+            "embedding_batches": -(-chunk_count // EMBEDDING_BATCH_SIZE),
+            "embedding_batch_size": EMBEDDING_BATCH_SIZE,
+            "embedding_concurrency": EMBEDDING_CONCURRENCY,
+            "source_bytes": size,
+        }
         db.commit()
         
-        # Save vector store
-        save_vector_store()
+        # Replacing chunks may have pushed the tombstone ratio over the compaction threshold
+        if previous_chunk_ids:
+            vector_store.compact_if_needed()
         
         return True
     except Exception as e:
-        # Update document status on error
+        # Update document status on error; the rollback drops the new chunk rows, so drop their vectors too
+        db.rollback()
+        if added_chunk_ids:
+            vector_store.remove_chunks(added_chunk_ids)
+        timings["total_seconds"] = time.perf_counter() - started
         document.status = "failed"
         document.embedding_status = "failed"
+        document.processing_stats = {**timings, "error": str(e)}
         db.commit()
         print(f"Error processing document: {str(e)}")
         return False
 
-def retrieve_relevant_chunks(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-    """Retrieve the most relevant document chunks for a query."""
-    if index is None or index.ntotal == 0:
+def reembed_corpus(db: Session, backend: embeddings.EmbeddingBackend, batch_size: int = 256) -> Dict[str, Any]:
+    """Re-embed every chunk with another backend into a staged index, then swap it in.
+    
+    Progress is checkpointed after each batch, so an interrupted run resumes where it stopped.
+    """
+    staged, state = vector_store.load_reembed_job(backend.name, backend.dimension)
+    if state["embedded"]:
+        print(f"Resuming after chunk {state['last_chunk_id']} ({state['embedded']} chunks already embedded)")
+    
+    # Walk chunks in ID order; chunks ingested while the job runs have higher IDs and are picked up too
+    while True:
+        rows = db.query(DocumentChunk.id, DocumentChunk.content).filter(
+            DocumentChunk.id > state["last_chunk_id"]
+        ).order_by(DocumentChunk.id).limit(batch_size).all()
+        if not rows:
+            break
+        vectors = embed_texts([row.content for row in rows], backend)
+        staged.add_with_ids(vectors, np.array([row.id for row in rows], dtype=np.int64))
+        state["last_chunk_id"] = rows[-1].id
+        state["embedded"] += len(rows)
+        vector_store.save_reembed_job(staged, state)
+        print(f"Embedded {state['embedded']} chunks (up to chunk {state['last_chunk_id']})")
+    
+    # Chunks deleted while the job ran are dropped from the staged index before it goes live
+    live_chunk_ids = {row.id for row in db.query(DocumentChunk.id)}
+    return vector_store.finish_reembed_job(staged, backend.name, live_chunk_ids)
+
+async def fetch_chunks(db: AsyncSession, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Load text and document metadata for search hits in one query, keeping hit order."""
+    if not hits:
         return []
     
-    # Create query embedding
-    query_embedding = embeddings_model.embed_query(query)
-    
-    # Search index
-    distances, indices = index.search(np.array([query_embedding], dtype=np.float32), top_k)
+    rows = (await db.execute(select(
+        DocumentChunk.id, DocumentChunk.content, DocumentChunk.document_id,
+        Document.name, Document.context_notes, Document.document_type
+    ).join(Document, Document.id == DocumentChunk.document_id).where(
+        DocumentChunk.id.in_([hit["chunk_id"] for hit in hits])
+    ))).all()
+    by_id = {row.id: row for row in rows}
     
-    # Get document chunks
     results = []
-    for i, idx in enumerate(indices[0]):
-        if idx != -1 and idx < index.ntotal:  # Valid index
-            # Find the document ID for this index
-            embedding_ids = list(document_lookup.keys())
-            if idx < len(embedding_ids):
-                embedding_id = embedding_ids[idx]
-                chunk_info = document_lookup[embedding_id]
-                chunk_info["relevance_score"] = float(1.0 / (1.0 + distances[0][i]))  # Convert distance to relevance score
-                results.append(chunk_info)
-    
+    for hit in hits:
+        row = by_id.get(hit["chunk_id"])
+        if row is None:
+            # Chunk deleted after the index was loaded
+            continue
+        results.append({
+            "document_id": row.document_id,
+            "chunk_id": row.id,
+            "document_name": row.name,
+            "content": row.content,
+            "context_notes": row.context_notes,
+            "document_type": row.document_type,
+            "relevance_score": hit["relevance_score"]
+        })
     return results
 
-def create_personalized_system_prompt(db: Session, user_id: int) -> str:
-    """Create a personalized system prompt based on user profile and history."""
-    # Get user and profile
-    user = db.query(User).filter(User.id == user_id).first()
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+async def retrieve_relevant_chunks(db: AsyncSession, query: str, top_k: int = 3, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Retrieve the most relevant document chunks for a query; nprobe and ef_search tune approximate indexes."""
+    await asyncio.to_thread(vector_store.refresh)
+    if vector_store.size() == 0:
+        return []
     
-    base_prompt = """You are an AI mental health support assistant designed to provide empathetic, 
+    # Create query embedding
+    query_embedding = await embed_query(query)
+    
+    # Search index for chunk IDs off the event loop, then fetch their text and metadata on demand
+    hits = await asyncio.to_thread(
+        vector_store.search, query_embedding, top_k, nprobe=nprobe, ef_search=ef_search
+    )
+    return await fetch_chunks(db, hits)
+
+BASE_SYSTEM_PROMPT = """You are an AI mental health support assistant designed to provide empathetic, 
     helpful guidance. Your responses should be supportive, non-judgmental, and focused on the user's wellbeing. 
     You are not a replacement for professional mental health care, and you should suggest seeking professional 
     help when appropriate."""
+
+CONTEXT_INSTRUCTION = "\n\nUse the following context to answer the user's question: "
+
+async def create_personalized_system_prompt(db: AsyncSession, user_id: int) -> str:
+    """Create a personalized system prompt based on user profile and history."""
+    return await prompt_cache.get_or_build(
+        "rag", (prompt_cache.PROFILE,), user_id, None, lambda: _build_personalized_system_prompt(db, user_id)
+    )
+
+async def _build_personalized_system_prompt(db: AsyncSession, user_id: int) -> str:
+    # Get user and profile
+    user = await db.scalar(select(User).where(User.id == user_id))
+    profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+    
+    base_prompt = BASE_SYSTEM_PROMPT
     
     if not profile:
         return base_prompt
@@ -189,16 +299,12 @@ def create_personalized_system_prompt(db: Session, user_id: int) -> str:
     
     return personalized_prompt
 
-def query_documents(db: Session, query: str, user_id: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
-    """Query the document store using RAG and return a response with metadata."""
-    start_time = time.time()
-    
-    # Initialize vector store if needed
-    if index is None:
-        initialize_vector_store()
+async def prepare_rag_prompt(db: AsyncSession, query: str, user_id: Optional[int] = None) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """Retrieve context for a query and build the chat messages to send to the model."""
+    from langchain_core.prompts import ChatPromptTemplate
     
     # Retrieve relevant chunks
-    relevant_chunks = retrieve_relevant_chunks(query)
+    relevant_chunks = await retrieve_relevant_chunks(db, query)
     
     # Create context from chunks
     context = "\n\n".join([chunk["content"] for chunk in relevant_chunks])
@@ -206,33 +312,19 @@ def query_documents(db: Session, query: str, user_id: Optional[int] = None) -> T
     # Create system prompt
     system_prompt = "You are a helpful AI mental health assistant."
     if user_id:
-        system_prompt = create_personalized_system_prompt(db, user_id)
+        system_prompt = await create_personalized_system_prompt(db, user_id)
     
     # Create chat template
     template = ChatPromptTemplate.from_messages([
-        ("system", system_prompt + "\n\nUse the following context to answer the user's question: {context}"),
+        ("system", system_prompt + CONTEXT_INSTRUCTION + "{context}"),
         ("user", "{question}")
     ])
     
-    # Create LLM
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
-    
-    # Create RAG chain
-    rag_chain = (
-        {"context": lambda x: context, "question": lambda x: x}
-        | template
-        | llm
-        | StrOutputParser()
-    )
-    
-    # Generate response
-    response = rag_chain.invoke(query)
-    
-    # Calculate processing time
-    processing_time = time.time() - start_time
-    
-    # Create metadata
-    metadata = {
+    return template.format_messages(context=context, question=query), relevant_chunks
+
+def rag_metadata(relevant_chunks: List[Dict[str, Any]], processing_time: float, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Build the metadata stored with a RAG answer."""
+    return {
         "references": [{
             "document_name": chunk["document_name"],
             "relevance_score": chunk["relevance_score"],
@@ -242,15 +334,53 @@ def query_documents(db: Session, query: str, user_id: Optional[int] = None) -> T
         "chunks_retrieved": len(relevant_chunks),
         "personalized": user_id is not None
     }
+
+async def lookup_cached_answer(query: str, prompt: List[Any], relevant_chunks: List[Dict[str, Any]], user_id: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Look up a cached answer for a prepared RAG prompt; also returns the key to store a new answer under."""
+    if not answer_cache.ANSWER_CACHE_ENABLED:
+        return None, {}
+    
+    # Prompts carrying profile details are scoped to their user; the generic prompt is shared
+    personalized = user_id is not None and not prompt[0].content.startswith(BASE_SYSTEM_PROMPT + CONTEXT_INSTRUCTION)
+    
+    # The query embedding was just computed for retrieval, so this is an embedding cache hit
+    key = {
+        "scope": answer_cache.scope_for(user_id if personalized else None, prompt[0].content),
+        "query": query,
+        "query_vector": await embed_query(query),
+        "chunk_ids": [chunk["chunk_id"] for chunk in relevant_chunks],
+        "document_ids": [chunk["document_id"] for chunk in relevant_chunks],
+    }
+    entry = answer_cache.lookup(key["scope"], key["query_vector"], key["chunk_ids"])
+    return entry, key
+
+async def query_documents(db: AsyncSession, query: str, user_id: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """Query the document store using RAG and return a response with metadata."""
+    start_time = time.time()
+    prompt, relevant_chunks = await prepare_rag_prompt(db, query, user_id)
+    
+    # Reuse the answer to a near-identical question over the same chunks
+    entry, cache_key = await lookup_cached_answer(query, prompt, relevant_chunks, user_id)
+    if entry is not None:
+        metadata = rag_metadata(relevant_chunks, time.time() - start_time, user_id)
+        metadata["answer_cache"] = {"hit": True, "similarity": entry["similarity"], "entry_hits": entry["hits"]}
+        return entry["answer"], metadata
+    
+    # Generate response
+    llm = llm_clients.get_chat_model("gpt-4o", temperature=0.7)
+    response = await llm.ainvoke(prompt)
+    
+    if cache_key:
+        answer_cache.store(answer=response.content, **cache_key)
     
-    return response, metadata
+    return response.content, rag_metadata(relevant_chunks, time.time() - start_time, user_id)
 
-def analyze_sentiment(text: str) -> str:
+async def analyze_sentiment(text: str) -> str:
     """Analyze the sentiment of a text using OpenAI."""
     prompt = f"Analyze the sentiment of the following text and respond with a single word (positive, negative, or neutral): {text}"
     
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-    response = llm.invoke(prompt)
+    llm = llm_clients.get_chat_model("gpt-3.5-turbo", temperature=0)
+    response = await llm.ainvoke(prompt)
     
     # Extract sentiment from response
     sentiment = response.content.strip().lower()
@@ -261,33 +391,41 @@ def analyze_sentiment(text: str) -> str:
     else:
         return "neutral"
 
-def detect_intent(text: str) -> str:
+async def detect_intent(text: str) -> str:
     """Detect the intent of a user message using OpenAI."""
     prompt = f"""Identify the primary intent of the following message from a mental health support chat. 
-    Respond with a single word or short phrase (e.g., 'seeking_advice', 'expressing_gratitude', 'reporting_crisis', 
-    'sharing_experience', 'asking_question', etc.): {text}"""
+    Respond with exactly one of: {', '.join(INTENT_LABELS)}: {text}"""
     
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-    response = llm.invoke(prompt)
+    llm = llm_clients.get_chat_model("gpt-3.5-turbo", temperature=0)
+    response = await llm.ainvoke(prompt)
     
-    # Extract intent from response
-    intent = response.content.strip().lower()
-    return intent
+    # Map the response onto the fixed intent vocabulary
+    return normalize_intent(response.content)
 
-def generate_conversation_summary(messages: List[Dict[str, Any]]) -> str:
-    """Generate a summary of a conversation based on messages."""
+async def generate_conversation_summary(messages: List[Dict[str, Any]], previous_summary: Optional[str] = None) -> str:
+    """Generate a summary of a conversation, folding new messages into its previous summary if given."""
     if not messages:
-        return ""
+        return previous_summary or ""
     
     # Format messages for the prompt
     formatted_messages = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in messages])
     
-    prompt = f"""Summarize the following mental health support conversation in 2-3 sentences, 
+    if previous_summary:
+        prompt = f"""Here is a summary of a mental health support conversation so far:
+    
+    {previous_summary}
+    
+    Update it with the following new messages. Keep it to 2-3 sentences, 
+    focusing on the main topics discussed and any key insights or recommendations:
+    
+    {formatted_messages}"""
+    else:
+        prompt = f"""Summarize the following mental health support conversation in 2-3 sentences, 
     focusing on the main topics discussed and any key insights or recommendations:
     
     {formatted_messages}"""
     
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3)
-    response = llm.invoke(prompt)
+    llm = llm_clients.get_chat_model("gpt-3.5-turbo", temperature=0.3)
+    response = await llm.ainvoke(prompt)
     
     return response.content.strip()
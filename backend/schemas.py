@@ -109,6 +109,7 @@ class DocumentResponse(DocumentBase):
     created_at: datetime
     embedding_status: Optional[str] = None
     chunk_count: Optional[int] = None
+    processing_stats: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -125,6 +126,7 @@ class ChatCompletionRequest(BaseModel):
     conversation_id: Optional[int] = None
     max_tokens: Optional[int] = 500
     temperature: Optional[float] = 0.7
+    prompt_cache_key: Optional[str] = None
 
 class ChatCompletionResponse(BaseModel):
     message: ChatMessage
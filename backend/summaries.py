@@ -0,0 +1,102 @@
+from sqlalchemy import select, update
+import os
+from dotenv import load_dotenv
+
+from .database import AsyncSessionLocal
+from .models import Conversation, Message
+from .rag import generate_conversation_summary
+from . import jobs
+from . import prompt_cache
+
+load_dotenv()
+
+# Conversation summaries are refreshed once a conversation has been quiet for the debounce window,
+# so a burst of turns costs one summary update instead of one per turn; 0 queues one after every turn
+SUMMARY_DEBOUNCE_SECONDS = float(os.getenv("SUMMARY_DEBOUNCE_SECONDS", "20"))
+# Upper bound on how long a busy conversation's summary can lag behind its first unsummarized turn
+SUMMARY_MAX_DELAY_SECONDS = float(os.getenv("SUMMARY_MAX_DELAY_SECONDS", "120"))
+# Most new messages folded into a conversation summary per model call
+SUMMARY_BATCH_MESSAGES = int(os.getenv("SUMMARY_BATCH_MESSAGES", "40"))
+
+async def schedule_update(conversation_id: int):
+    """Queue a summary update for a conversation; requests within the debounce window share one job."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(
+            db, jobs.UPDATE_CONVERSATION_SUMMARY, {"conversation_id": conversation_id},
+            dedupe_key=f"conversation_summary:{conversation_id}",
+            delay=SUMMARY_DEBOUNCE_SECONDS, max_delay=SUMMARY_MAX_DELAY_SECONDS
+        )
+        await db.commit()
+
+def overall_sentiment(positive_count: int, neutral_count: int, negative_count: int) -> str:
+    """Majority sentiment of a conversation's user messages; neutral on a tie."""
+    if positive_count > negative_count and positive_count > neutral_count:
+        return "positive"
+    if negative_count > positive_count and negative_count > neutral_count:
+        return "negative"
+    return "neutral"
+
+async def update_conversation_metadata(conversation_id: int):
+    """Fold the messages added since the last update into the conversation's summary and sentiment."""
+    async with AsyncSessionLocal() as db:
+        while True:
+            # Get conversation
+            conversation = await db.scalar(select(Conversation).where(Conversation.id == conversation_id))
+            if not conversation:
+                return
+            
+            # Get the messages after the summary's cursor, oldest first
+            query = select(Message).where(Message.conversation_id == conversation_id)
+            if conversation.summary_message_id is not None:
+                query = query.where(Message.id > conversation.summary_message_id)
+            messages = (await db.scalars(query.order_by(Message.id).limit(SUMMARY_BATCH_MESSAGES))).all()
+            if not messages:
+                return
+            
+            # Format messages for summary generation
+            formatted_messages = [{
+                "content": msg.content,
+                "sender": msg.sender,
+                "created_at": msg.created_at
+            } for msg in messages]
+            
+            # End the read transaction so the pooled connection is not held while waiting on the model
+            await db.commit()
+            
+            # Fold the new messages into the previous summary
+            summary = await generate_conversation_summary(formatted_messages, conversation.summary)
+            
+            # Add the new user messages' sentiments to the counters
+            sentiments = [msg.sentiment for msg in messages if msg.sender == "user" and msg.sentiment]
+            counts = {
+                "positive_count": conversation.positive_count + sentiments.count("positive"),
+                "neutral_count": conversation.neutral_count + sentiments.count("neutral"),
+                "negative_count": conversation.negative_count + sentiments.count("negative"),
+            }
+            
+            # Update conversation, unless another worker moved the cursor while the model was running
+            result = await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .where(
+                    Conversation.summary_message_id == conversation.summary_message_id
+                    if conversation.summary_message_id is not None
+                    else Conversation.summary_message_id.is_(None)
+                )
+                .values(
+                    summary=summary,
+                    summary_message_id=messages[-1].id,
+                    sentiment=overall_sentiment(**counts),
+                    **counts
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount == 0:
+                return
+            prompt_cache.bump(prompt_cache.SUMMARY, conversation.user_id)
+            
+            # A full batch may have left more messages behind it
+            if len(messages) < SUMMARY_BATCH_MESSAGES:
+                return
+            db.expunge_all()
@@ -0,0 +1,658 @@
+from typing import List, Dict, Any, Optional, Tuple
+from contextlib import contextmanager
+import os
+import fcntl
+import json
+import threading
+import time
+from dotenv import load_dotenv
+import shutil
+import faiss
+import numpy as np
+
+from . import embeddings
+
+load_dotenv()
+
+# Vector database path
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./vector_db")
+
+# Ensure vector DB directory exists
+os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+
+INDEX_FILE = "index.faiss"
+LEGACY_LOOKUP_FILE = "document_lookup.json"  # Row-ordered lookup written by older versions
+LEGACY_CHUNK_LOOKUP_FILE = "chunk_lookup.json"  # Chunk text copies, now read from the database instead
+TOMBSTONE_FILE = "tombstones.json"
+META_FILE = "index_meta.json"
+REEMBED_DIR = "reembed"  # Staging area of an in-progress re-embedding job
+REEMBED_STATE_FILE = "state.json"
+INDEX_LOCK_FILE = "index.lock"
+TOMBSTONE_LOCK_FILE = "tombstones.lock"
+
+# Model assumed for stores written before the embedding model was recorded
+LEGACY_EMBEDDING_MODEL = "openai:text-embedding-ada-002"
+
+# Open the index file memory-mapped and read-only so workers share it through the page cache
+MMAP_INDEX = os.getenv("VECTOR_STORE_MMAP", "false").lower() == "true"
+
+# Rebuild the index once this fraction of its vectors are tombstoned
+COMPACTION_THRESHOLD = float(os.getenv("VECTOR_COMPACTION_THRESHOLD", "0.2"))
+
+# Index type for new stores and migrations: a name from INDEX_TYPES or a raw FAISS factory string
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+HNSW_M = int(os.getenv("VECTOR_HNSW_M", "32"))  # Graph neighbours per node
+IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0"))  # Inverted lists; 0 derives it from corpus size
+PQ_M = int(os.getenv("VECTOR_PQ_M", "64"))  # PQ sub-quantizers; must divide the embedding dimension
+
+# Default query-time search parameters, overridable per search
+DEFAULT_NPROBE = int(os.getenv("VECTOR_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", "64"))
+
+# Supported index types
+INDEX_TYPES = ["flat", "hnsw", "hnsw_sq8", "ivf_flat", "ivf_sq8", "ivf_pq"]
+
+# Dimension of the loaded index and the embedding model that produced its vectors
+index_dimension = 1536
+embedding_model = None
+
+# FAISS index whose IDs are DocumentChunk.id; chunk text and metadata stay in the database
+index = None
+index_type = "flat"
+
+# Deleted chunk IDs whose vectors are still physically in the index; replaced rather than
+# mutated, so the search filter built from it can be cached against the set it was built from
+tombstones = frozenset()
+_tombstone_filter = None
+
+# Tombstones this process dropped because their vectors left the index, removed from the
+# tombstone file with the next save
+_purged = frozenset()
+
+# Whether the index is still the read-only mapping, and whether it has unsaved changes
+_mapped = False
+_index_dirty = False
+
+# Modification times of the index and tombstone files this process last read or wrote
+_loaded_mtimes = None
+
+# Ingestion runs in background threads while searches run on request threads
+_lock = threading.RLock()
+_writers = threading.local()
+_compaction_lock = threading.Lock()
+# (ids, vectors) added while a rebuild runs, carried over into the rebuilt index; None when idle
+_rebuild_added: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+last_compaction: Optional[Dict[str, Any]] = None
+
+def _path(name: str) -> str:
+    return os.path.join(VECTOR_DB_PATH, name)
+
+class _FileLock:
+    """Exclusive fcntl lock on a file in the store, serialising load-modify-save across processes.
+
+    The threads of one process share it, since they already coordinate through _lock: the first
+    to enter takes the lock and the last to leave releases it. It is never waited for while
+    holding _lock, so searches do not stall behind another process.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._guard = threading.Lock()
+        self._holders = 0
+        self._file = None
+
+    def __enter__(self):
+        with self._guard:
+            if self._holders == 0:
+                lock_file = open(_path(self.name), "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._file = lock_file
+            self._holders += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._guard:
+            self._holders -= 1
+            if self._holders == 0:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
+
+# Held by index writers (ingestion, compaction, migration, re-embedding) until they have saved;
+# tombstone writers, like the API's deletes, only take the short tombstone lock
+_index_lock = _FileLock(INDEX_LOCK_FILE)
+_tombstone_lock = _FileLock(TOMBSTONE_LOCK_FILE)
+
+def _ivf_nlist(n_vectors: int) -> int:
+    """Number of inverted lists for a corpus of n_vectors."""
+    if IVF_NLIST > 0:
+        return IVF_NLIST
+    return max(1, min(65536, int(4 * np.sqrt(max(n_vectors, 1)))))
+
+def factory_string(kind: str, n_vectors: int = 0) -> str:
+    """Translate an index type into a FAISS index_factory string."""
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if kind == "hnsw_sq8":
+        return f"HNSW{HNSW_M}_SQ8"
+    if kind == "ivf_flat":
+        return f"IVF{_ivf_nlist(n_vectors)},Flat"
+    if kind == "ivf_sq8":
+        return f"IVF{_ivf_nlist(n_vectors)},SQ8"
+    if kind == "ivf_pq":
+        return f"IVF{_ivf_nlist(n_vectors)},PQ{PQ_M}"
+    # Anything else is passed through as a factory string, e.g. "OPQ64,IVF1024,PQ64"
+    return kind
+
+def min_training_vectors(kind: str, n_vectors: int = 0) -> int:
+    """Smallest corpus an index type can be trained on (0 if it needs no training)."""
+    probe = faiss.index_factory(index_dimension, factory_string(kind, n_vectors))
+    if probe.is_trained:
+        return 0
+    needed = 0
+    try:
+        needed = faiss.extract_index_ivf(probe).nlist
+    except RuntimeError:
+        pass
+    # 8-bit PQ codebooks need at least 256 points per sub-quantizer
+    return max(needed, 256)
+
+def build_index(kind: str, vectors: Optional[np.ndarray] = None, ids: Optional[np.ndarray] = None, dimension: Optional[int] = None):
+    """Create an ID-mapped index of the given type, training it on vectors if needed."""
+    n_vectors = 0 if vectors is None else len(vectors)
+    inner = faiss.index_factory(dimension or index_dimension, factory_string(kind, n_vectors))
+    try:
+        # IVF needs a direct map so vectors can be reconstructed for compaction and migration
+        faiss.extract_index_ivf(inner).make_direct_map()
+    except RuntimeError:
+        pass
+    built = faiss.IndexIDMap2(inner)
+    if not built.is_trained:
+        needed = min_training_vectors(kind, n_vectors)
+        if n_vectors < needed:
+            raise ValueError(f"Index type {kind} needs at least {needed} vectors to train, got {n_vectors}")
+        built.train(vectors)
+    if n_vectors > 0:
+        built.add_with_ids(vectors, ids)
+    return built
+
+def _new_index():
+    """Create an empty index for the configured embedding model and index type (flat if that type needs training first)."""
+    global index_type, index_dimension, embedding_model
+    backend = embeddings.get_backend()
+    index_dimension = backend.dimension
+    embedding_model = backend.name
+    index_type = INDEX_TYPE if min_training_vectors(INDEX_TYPE) == 0 else "flat"
+    return build_index(index_type)
+
+def _search_parameters(target, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """Per-query FAISS search parameters for an index, or None for exact indexes without a selector."""
+    inner = faiss.downcast_index(target.index)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or DEFAULT_NPROBE)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef_search or DEFAULT_EF_SEARCH, top_k))
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+def _live_selector():
+    """FAISS selector that skips tombstoned IDs inside the search, or None without tombstones; caller holds _lock."""
+    global _tombstone_filter
+    if not tombstones:
+        return None
+    if _tombstone_filter is None or _tombstone_filter[0] is not tombstones:
+        # The Not selector only points at the batch selector, so both are kept referenced
+        excluded = faiss.IDSelectorBatch(np.array(sorted(tombstones), dtype=np.int64))
+        _tombstone_filter = (tombstones, excluded, faiss.IDSelectorNot(excluded))
+    return _tombstone_filter[2]
+
+def _live_vectors(source):
+    """IDs and reconstructed vectors of every non-tombstoned row; caller holds _lock."""
+    ids = faiss.vector_to_array(source.id_map)
+    live = ~np.isin(ids, np.array(sorted(tombstones), dtype=np.int64))
+    if source.ntotal == 0:
+        return ids, np.zeros((0, index_dimension), dtype=np.float32)
+    return ids[live], source.index.reconstruct_n(0, source.ntotal)[live]
+
+def _migrate_legacy_store(legacy_index, legacy_lookup: Dict[str, Dict[str, Any]]):
+    """Convert a row-ordered index and its lookup into an ID-mapped index keyed by chunk ID."""
+    # Legacy rows were appended in lookup insertion order
+    entries = list(legacy_lookup.values())[:legacy_index.ntotal]
+    if not entries:
+        return build_index("flat")
+    vectors = legacy_index.reconstruct_n(0, len(entries))
+    ids = np.array([entry["chunk_id"] for entry in entries], dtype=np.int64)
+    return build_index("flat", vectors, ids)
+
+def _file_mtimes():
+    return tuple(os.stat(_path(name)).st_mtime_ns if os.path.exists(_path(name)) else None for name in (INDEX_FILE, TOMBSTONE_FILE))
+
+def _read_index():
+    """Read the index file, memory-mapped when MMAP_INDEX is set."""
+    global _mapped
+    _mapped = MMAP_INDEX
+    if MMAP_INDEX:
+        return faiss.read_index(_path(INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(_path(INDEX_FILE))
+
+def _read_tombstones() -> frozenset:
+    if not os.path.exists(_path(TOMBSTONE_FILE)):
+        return frozenset()
+    with open(_path(TOMBSTONE_FILE), 'r') as f:
+        return frozenset(json.load(f))
+
+def _load_index():
+    """Read the index file and its metadata; caller holds _lock."""
+    global index, index_type, index_dimension, embedding_model, last_compaction
+    index = _read_index()
+    meta = {}
+    if os.path.exists(_path(META_FILE)):
+        with open(_path(META_FILE), 'r') as f:
+            meta = json.load(f)
+    index_type = meta.get("index_type", "flat")
+    index_dimension = index.d
+    embedding_model = meta.get("embedding_model", LEGACY_EMBEDDING_MODEL)
+    last_compaction = meta.get("last_compaction")
+
+def _writable():
+    """Swap a read-only mapped index for a private in-memory copy before mutating it; caller holds _lock."""
+    global index, _mapped
+    if _mapped:
+        index = faiss.read_index(_path(INDEX_FILE))
+        _mapped = False
+
+def initialize_vector_store():
+    """Initialize or load the FAISS vector store."""
+    global index, index_type, index_dimension, embedding_model, tombstones, _index_dirty, _loaded_mtimes
+    migrated_legacy = False
+    with _lock:
+        # Taken before reading, so a file replaced meanwhile is read again on the next refresh
+        _loaded_mtimes = _file_mtimes()
+        tombstones = _read_tombstones() - _purged
+
+        if os.path.exists(_path(INDEX_FILE)) and os.path.exists(_path(LEGACY_LOOKUP_FILE)):
+            # Upgrade a store written before chunk IDs were used as vector IDs
+            with open(_path(LEGACY_LOOKUP_FILE), 'r') as f:
+                legacy_lookup = json.load(f)
+            legacy_index = faiss.read_index(_path(INDEX_FILE))
+            index_dimension = legacy_index.d
+            embedding_model = LEGACY_EMBEDDING_MODEL
+            index = _migrate_legacy_store(legacy_index, legacy_lookup)
+            index_type = "flat"
+            _index_dirty = True
+            migrated_legacy = True
+        elif os.path.exists(_path(INDEX_FILE)):
+            # Load existing index
+            _load_index()
+        else:
+            # Create new index
+            index = _new_index()
+        
+        # Vectors from different models are not comparable, so a mismatch needs an explicit re-embed
+        configured = embeddings.get_backend().name
+        if embedding_model != configured:
+            if index.ntotal > 0:
+                raise RuntimeError(
+                    f"The vector index was built with {embedding_model} but the configured embedding model is "
+                    f"{configured}; run `python -m backend.cli reembed` to rebuild it"
+                )
+            # An empty index can simply be recreated for the new model
+            index = _new_index()
+            _index_dirty = True
+
+        # Chunk text is read from the database now, so the duplicated copy is dropped
+        if os.path.exists(_path(LEGACY_CHUNK_LOOKUP_FILE)):
+            os.remove(_path(LEGACY_CHUNK_LOOKUP_FILE))
+
+    if _index_dirty:
+        save_vector_store()
+        if migrated_legacy:
+            os.remove(_path(LEGACY_LOOKUP_FILE))
+
+def _sync():
+    """Re-read the files another process has replaced since this one last read or wrote them; caller holds _lock.
+
+    Files are only ever replaced whole, so reading needs no file lock.
+    """
+    global tombstones, _loaded_mtimes
+    index_mtime, tombstone_mtime = _file_mtimes()
+    loaded_index_mtime, loaded_tombstone_mtime = _loaded_mtimes
+    if tombstone_mtime != loaded_tombstone_mtime:
+        tombstones = _read_tombstones() - _purged
+        loaded_tombstone_mtime = tombstone_mtime
+    # Unsaved index changes are only made under the index lock, so the file has not moved under them
+    if index_mtime != loaded_index_mtime and not _index_dirty:
+        _load_index()
+        loaded_index_mtime = index_mtime
+    _loaded_mtimes = (loaded_index_mtime, loaded_tombstone_mtime)
+
+def refresh():
+    """Pick up store files another process has rewritten since this one loaded or wrote them."""
+    if index is None:
+        initialize_vector_store()
+    elif _loaded_mtimes != _file_mtimes():
+        with _lock:
+            _sync()
+
+@contextmanager
+def writing():
+    """Hold the index lock across a series of index changes, saving them when the outermost block exits.
+
+    The in-memory store is brought up to date with the files first, and other processes' index
+    writers wait until the changes are saved; searches and tombstoning are not blocked.
+    """
+    depth = getattr(_writers, "depth", 0)
+    with _index_lock:
+        if depth == 0:
+            refresh()
+        _writers.depth = depth + 1
+        try:
+            yield
+        finally:
+            _writers.depth = depth
+            if depth == 0:
+                save_vector_store()
+
+def save_vector_store():
+    """Save the FAISS index and tombstones to disk."""
+    global index, _index_dirty
+    with _index_lock, _tombstone_lock, _lock:
+        # Write to temporary files first so a crash never leaves a half-written store
+        if _index_dirty or not os.path.exists(_path(INDEX_FILE)):
+            faiss.write_index(index, _path(INDEX_FILE + ".tmp"))
+            with open(_path(META_FILE + ".tmp"), 'w') as f:
+                json.dump({
+                    "index_type": index_type,
+                    "dimension": index_dimension,
+                    "embedding_model": embedding_model,
+                    "last_compaction": last_compaction,
+                }, f)
+            os.replace(_path(INDEX_FILE + ".tmp"), _path(INDEX_FILE))
+            os.replace(_path(META_FILE + ".tmp"), _path(META_FILE))
+            _index_dirty = False
+            if MMAP_INDEX:
+                # Drop the private copy and map the file just written
+                index = _read_index()
+        _save_tombstones()
+
+def _save_tombstones():
+    """Write the tombstone set merged with the file; caller holds the tombstone lock and _lock.
+
+    Tombstones other processes wrote since this one read the file are kept, and those whose
+    vectors this process has physically removed are dropped.
+    """
+    global tombstones, _purged, _loaded_mtimes
+    tombstones = (tombstones | _read_tombstones()) - _purged
+    _purged = frozenset()
+    with open(_path(TOMBSTONE_FILE + ".tmp"), 'w') as f:
+        json.dump(sorted(tombstones), f)
+    os.replace(_path(TOMBSTONE_FILE + ".tmp"), _path(TOMBSTONE_FILE))
+    _loaded_mtimes = _file_mtimes()
+
+def add_chunks(vectors: np.ndarray, chunk_ids: List[int]):
+    """Add chunk vectors to the index under their chunk IDs; saved when the enclosing writing() block exits."""
+    global _index_dirty
+    if len(chunk_ids) == 0:
+        return
+    ids = np.array(chunk_ids, dtype=np.int64)
+    with writing(), _lock:
+        _writable()
+        # A reused chunk ID must not match the stale vector it replaces
+        reused = [chunk_id for chunk_id in ids.tolist() if chunk_id in tombstones]
+        if reused:
+            _purge(reused)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index.add_with_ids(vectors, ids)
+        _index_dirty = True
+        if _rebuild_added is not None:
+            _rebuild_added.append((ids, vectors))
+
+def _purge(chunk_ids: List[int]):
+    """Physically drop tombstoned vectors from the index; caller holds _lock."""
+    global index, index_type, tombstones, _purged, _index_dirty
+    _index_dirty = True
+    try:
+        index.remove_ids(faiss.IDSelectorBatch(np.array(chunk_ids, dtype=np.int64)))
+        removed = frozenset(chunk_ids)
+    except RuntimeError:
+        # Graph and IVF direct-map indexes cannot remove in place, so rebuild without tombstones
+        ids, vectors = _live_vectors(index)
+        if len(vectors) < min_training_vectors(index_type, len(vectors)):
+            index_type = "flat"
+        index = build_index(index_type, vectors, ids)
+        removed = tombstones
+    tombstones = tombstones - removed
+    _purged = _purged | removed
+
+def remove_chunks(chunk_ids: List[int]) -> int:
+    """Tombstone chunk vectors so searches stop returning them immediately; returns the count removed."""
+    global tombstones
+    refresh()
+    with _tombstone_lock, _lock:
+        _sync()
+        before = len(tombstones)
+        tombstones = tombstones.union(int(chunk_id) for chunk_id in chunk_ids)
+        # Persist right away so other processes stop returning these chunks too
+        _save_tombstones()
+        return len(tombstones) - before
+
+def tombstone_ratio() -> float:
+    """Fraction of vectors in the index that are tombstoned."""
+    total = size()
+    return len(tombstones) / total if total else 0.0
+
+def _rebuild(kind: str) -> Dict[str, Any]:
+    """Rebuild the index as the given type from its live vectors, training it if needed."""
+    global index, index_type, tombstones, _purged, _mapped, _index_dirty, _rebuild_added
+    started = time.perf_counter()
+
+    # The index lock keeps other processes from writing the index until the rebuilt one is saved;
+    # searches, tombstoning and this process's ingestion continue while it is built
+    with writing():
+        # Snapshot the current rows
+        with _lock:
+            snapshot_rows = index.ntotal
+            snapshot_tombstones = tombstones
+            ids, vectors = _live_vectors(index)
+            # Rows added from here on are recorded by add_chunks, whichever index object they land in
+            _rebuild_added = []
+
+        try:
+            rebuilt = build_index(kind, vectors, ids)
+        except BaseException:
+            with _lock:
+                _rebuild_added = None
+            raise
+
+        with _lock:
+            # Carry over rows added while rebuilding
+            for added_ids, added_vectors in _rebuild_added:
+                rebuilt.add_with_ids(added_vectors, added_ids)
+            _rebuild_added = None
+            index = rebuilt
+            index_type = kind
+            _mapped = False
+            _index_dirty = True
+            # Tombstones created during the rebuild still refer to vectors in the new index
+            tombstones = tombstones - snapshot_tombstones
+            _purged = _purged | snapshot_tombstones
+
+    return {
+        "index_type": kind,
+        "removed_vectors": snapshot_rows - len(ids),
+        "index_size": rebuilt.ntotal,
+        "duration_seconds": time.perf_counter() - started,
+        "completed_at": time.time(),
+    }
+
+def compact() -> Dict[str, Any]:
+    """Rebuild the index without tombstoned vectors."""
+    global last_compaction
+    with _compaction_lock, writing():
+        # Keep the current type unless too few vectors remain to retrain it
+        live_vectors = size() - len(tombstones)
+        kind = index_type if live_vectors >= min_training_vectors(index_type, live_vectors) else "flat"
+        # Saved with the index when the block exits, so every process's stats report it
+        last_compaction = _rebuild(kind)
+        return last_compaction
+
+def compact_if_needed() -> Optional[Dict[str, Any]]:
+    """Compact the index when the tombstone ratio passes VECTOR_COMPACTION_THRESHOLD."""
+    refresh()
+    if tombstones and tombstone_ratio() >= COMPACTION_THRESHOLD:
+        return compact()
+    return None
+
+def migrate(kind: str) -> Dict[str, Any]:
+    """Rebuild the current index as a different index type, trained on the stored vectors."""
+    refresh()
+    with _compaction_lock:
+        return _rebuild(kind)
+
+def evaluate(kind: str, k: int = 10, n_queries: int = 200, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, Any]:
+    """Measure recall@k and query latency of an index type against an exact flat baseline."""
+    with _lock:
+        if index is None:
+            initialize_vector_store()
+        ids, vectors = _live_vectors(index)
+    if len(vectors) == 0:
+        raise ValueError("The vector store is empty")
+
+    # Queries are stored vectors plus a little noise, so they sit near but not on a point
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    queries = (sample + rng.normal(scale=0.01, size=sample.shape)).astype(np.float32)
+
+    baseline = build_index("flat", vectors, ids)
+    candidate = build_index(kind, vectors, ids)
+
+    def run(target):
+        params = _search_parameters(target, k, nprobe, ef_search)
+        found, latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            _, hits = target.search(query.reshape(1, -1), k, params=params)
+            latencies.append(time.perf_counter() - started)
+            found.append(set(hits[0][hits[0] != -1].tolist()))
+        return found, np.array(latencies) * 1000
+
+    exact, flat_latency = run(baseline)
+    approx, approx_latency = run(candidate)
+
+    recall = np.mean([len(a & e) / max(1, len(e)) for a, e in zip(approx, exact)])
+    return {
+        "index_type": kind,
+        "factory": factory_string(kind, len(vectors)),
+        "vectors": len(vectors),
+        "queries": len(queries),
+        "k": k,
+        "recall_at_k": float(recall),
+        "latency_ms": {"p50": float(np.percentile(approx_latency, 50)), "p95": float(np.percentile(approx_latency, 95))},
+        "flat_latency_ms": {"p50": float(np.percentile(flat_latency, 50)), "p95": float(np.percentile(flat_latency, 95))},
+        "index_bytes": int(faiss.serialize_index(candidate).size),
+        "flat_index_bytes": int(faiss.serialize_index(baseline).size),
+    }
+
+def stats() -> Dict[str, Any]:
+    """Report index size and tombstone state."""
+    refresh()
+    index_path = _path(INDEX_FILE)
+    return {
+        "index_type": index_type,
+        "embedding_model": embedding_model,
+        "dimension": index_dimension,
+        "reembed": load_reembed_progress(),
+        "memory_mapped": _mapped,
+        "index_size": size(),
+        "live_vectors": size() - len(tombstones),
+        "tombstones": len(tombstones),
+        "tombstone_ratio": tombstone_ratio(),
+        "compaction_threshold": COMPACTION_THRESHOLD,
+        "compaction_running": _compaction_lock.locked(),
+        "index_file_bytes": os.path.getsize(index_path) if os.path.exists(index_path) else 0,
+        "last_compaction": last_compaction,
+    }
+
+def size() -> int:
+    """Number of vectors in the index."""
+    return 0 if index is None else index.ntotal
+
+def search(query_vector: np.ndarray, top_k: int = 3, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return the chunk_id and relevance_score of the top_k nearest live chunks."""
+    refresh()
+    with _lock:
+        if index is None or index.ntotal == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        # Tombstoned vectors are filtered inside FAISS, so k stays top_k however many there are
+        k = min(top_k, index.ntotal)
+        params = _search_parameters(index, k, nprobe, ef_search, selector=_live_selector())
+        distances, ids = index.search(query, k, params=params)
+
+    results = []
+    for distance, chunk_id in zip(distances[0], ids[0]):
+        if chunk_id == -1:
+            continue
+        results.append({
+            "chunk_id": int(chunk_id),
+            "relevance_score": float(1.0 / (1.0 + distance))  # Convert distance to relevance score
+        })
+
+    return results
+
+def _reembed_path(name: str) -> str:
+    return os.path.join(VECTOR_DB_PATH, REEMBED_DIR, name)
+
+def load_reembed_progress() -> Optional[Dict[str, Any]]:
+    """State of an unfinished re-embedding job, or None."""
+    if not os.path.exists(_reembed_path(REEMBED_STATE_FILE)):
+        return None
+    with open(_reembed_path(REEMBED_STATE_FILE), 'r') as f:
+        return json.load(f)
+
+def load_reembed_job(model: str, dimension: int):
+    """Resume the staged index of a re-embedding job for a model, or start a new one."""
+    state = load_reembed_progress()
+    if state is not None and state["embedding_model"] == model and os.path.exists(_reembed_path(INDEX_FILE)):
+        return faiss.read_index(_reembed_path(INDEX_FILE)), state
+    # A job for another model is abandoned
+    shutil.rmtree(os.path.join(VECTOR_DB_PATH, REEMBED_DIR), ignore_errors=True)
+    os.makedirs(os.path.join(VECTOR_DB_PATH, REEMBED_DIR))
+    state = {"embedding_model": model, "dimension": dimension, "last_chunk_id": 0, "embedded": 0, "started_at": time.time()}
+    return build_index("flat", dimension=dimension), state
+
+def save_reembed_job(staged, state: Dict[str, Any]):
+    """Checkpoint the staged index and the job cursor together."""
+    faiss.write_index(staged, _reembed_path(INDEX_FILE + ".tmp"))
+    with open(_reembed_path(REEMBED_STATE_FILE + ".tmp"), 'w') as f:
+        json.dump(state, f)
+    # The index is replaced first; a crash in between only re-embeds the last batch
+    os.replace(_reembed_path(INDEX_FILE + ".tmp"), _reembed_path(INDEX_FILE))
+    os.replace(_reembed_path(REEMBED_STATE_FILE + ".tmp"), _reembed_path(REEMBED_STATE_FILE))
+
+def finish_reembed_job(staged, model: str, live_chunk_ids: set) -> Dict[str, Any]:
+    """Replace the live index with a completed re-embedding job's index, minus chunks no longer live."""
+    global index, index_type, index_dimension, embedding_model, tombstones, _purged, _mapped, _index_dirty
+    stale = [chunk_id for chunk_id in faiss.vector_to_array(staged.id_map).tolist() if chunk_id not in live_chunk_ids]
+    if stale:
+        staged.remove_ids(faiss.IDSelectorBatch(np.array(stale, dtype=np.int64)))
+    # The staged index replaces the live one outright, so it is not synced with the files first
+    with _index_lock, _tombstone_lock:
+        with _lock:
+            # Only tombstones of chunks deleted after the live set was read still match vectors
+            staged_ids = set(faiss.vector_to_array(staged.id_map).tolist())
+            removed = frozenset(chunk_id for chunk_id in tombstones | _read_tombstones() if chunk_id not in staged_ids)
+            index = staged
+            index_type = "flat"
+            index_dimension = staged.d
+            embedding_model = model
+            tombstones = tombstones - removed
+            _purged = _purged | removed
+            _mapped = False
+            _index_dirty = True
+        save_vector_store()
+    shutil.rmtree(os.path.join(VECTOR_DB_PATH, REEMBED_DIR), ignore_errors=True)
+    return {"embedding_model": model, "dimension": index_dimension, "index_size": index.ntotal, "removed_deleted_chunks": len(stale)}
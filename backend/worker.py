@@ -0,0 +1,163 @@
+"""Background worker: runs queued document ingestion, conversation summary and index compaction jobs.
+
+    python -m backend.worker
+
+Run one or more next to the API servers, against the same database and vector store. Each
+worker leases jobs from the queue, highest priority first, and runs at most the configured
+number of each kind at a time. On SIGTERM or SIGINT it stops claiming jobs and finishes the
+ones it is running; a job left behind by a killed worker is retried once its lease expires.
+"""
+import asyncio
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, Set
+
+from dotenv import load_dotenv
+
+from .database import AsyncSessionLocal, SessionLocal, async_engine, upgrade_database
+from .models import Document
+from . import document_text
+from . import jobs
+from . import llm_clients
+from . import vector_store
+
+load_dotenv()
+
+# Seconds between queue polls while the worker is idle
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Jobs of each kind run at once per worker; ingestion is CPU bound and writes the vector index
+INGESTION_JOB_CONCURRENCY = int(os.getenv("INGESTION_JOB_CONCURRENCY", "1"))
+SUMMARY_JOB_CONCURRENCY = int(os.getenv("SUMMARY_JOB_CONCURRENCY", "4"))
+
+# Seconds between sweeps for expired leases and old finished jobs
+MAINTENANCE_INTERVAL = 30
+
+def process_document(payload: Dict[str, Any]):
+    from .rag import process_document as ingest
+    # Ingestion keeps the sync engine and runs in a thread
+    db = SessionLocal()
+    try:
+        document = db.get(Document, payload["document_id"])
+        if document is None:
+            return  # Deleted since it was queued
+        if not ingest(db, document.id):
+            raise RuntimeError((document.processing_stats or {}).get("error", "Document processing failed"))
+    finally:
+        db.close()
+
+async def update_conversation_summary(payload: Dict[str, Any]):
+    from .summaries import update_conversation_metadata
+    await update_conversation_metadata(payload["conversation_id"])
+
+def compact_vector_store(payload: Dict[str, Any]):
+    # The API only tombstones vectors; rebuilding the index is left to workers
+    if payload.get("force"):
+        vector_store.compact()
+    else:
+        vector_store.compact_if_needed()
+
+# Job kind: (handler, jobs of the kind run at once)
+HANDLERS = {
+    jobs.UPDATE_CONVERSATION_SUMMARY: (update_conversation_summary, SUMMARY_JOB_CONCURRENCY),
+    jobs.PROCESS_DOCUMENT: (process_document, INGESTION_JOB_CONCURRENCY),
+    jobs.COMPACT_VECTOR_STORE: (compact_vector_store, 1),
+}
+
+async def keep_lease(job, worker_id: str):
+    """Renew a running job's lease until cancelled."""
+    while True:
+        await asyncio.sleep(jobs.JOB_LEASE_SECONDS / 3)
+        async with AsyncSessionLocal() as db:
+            held = await jobs.renew_lease(db, job, worker_id)
+            await db.commit()
+        if not held:
+            print(f"Lost the lease of job {job.id}; another worker may run it again")
+            return
+
+async def execute(job, worker_id: str):
+    handler, _ = HANDLERS[job.kind]
+    lease = asyncio.create_task(keep_lease(job, worker_id))
+    error = None
+    try:
+        if asyncio.iscoroutinefunction(handler):
+            await handler(job.payload)
+        else:
+            await asyncio.to_thread(handler, job.payload)
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {error}")
+    finally:
+        lease.cancel()
+
+    async with AsyncSessionLocal() as db:
+        if error is None:
+            await jobs.complete(db, job, worker_id)
+        else:
+            await jobs.fail(db, job, worker_id, error)
+        await db.commit()
+
+async def run(worker_id: str, stop: asyncio.Event):
+    """Claim and run jobs until stop is set, then wait for the running ones."""
+    running: Dict[str, Set[asyncio.Task]] = {kind: set() for kind in HANDLERS}
+    wake = asyncio.Event()
+    last_maintenance = 0.0
+
+    def finished(task, kind):
+        running[kind].discard(task)
+        wake.set()
+
+    while not stop.is_set():
+        wake.clear()
+        async with AsyncSessionLocal() as db:
+            if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                requeued = await jobs.requeue_expired(db)
+                purged = await jobs.purge_finished(db)
+                if requeued or purged:
+                    print(f"Requeued {requeued} jobs with expired leases, purged {purged} finished jobs")
+                last_maintenance = time.monotonic()
+            slots = {kind: limit - len(running[kind]) for kind, (_, limit) in HANDLERS.items()}
+            claimed = await jobs.claim(db, worker_id, slots)
+            await db.commit()
+
+        for job in claimed:
+            task = asyncio.create_task(execute(job, worker_id))
+            running[job.kind].add(task)
+            task.add_done_callback(lambda task, kind=job.kind: finished(task, kind))
+        if claimed:
+            continue
+
+        # Sleep until the next poll, a finished job frees a slot, or shutdown
+        waiters = [asyncio.create_task(stop.wait()), asyncio.create_task(wake.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=JOB_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    remaining = [task for tasks in running.values() for task in tasks]
+    if remaining:
+        print(f"Waiting for {len(remaining)} running jobs")
+        await asyncio.gather(*remaining, return_exceptions=True)
+
+async def main():
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    await asyncio.to_thread(upgrade_database)
+    await asyncio.to_thread(vector_store.initialize_vector_store)
+    await asyncio.to_thread(document_text.start_workers)
+    print(f"Worker {worker_id} running {', '.join(f'{kind} x{limit}' for kind, (_, limit) in HANDLERS.items())}")
+    try:
+        await run(worker_id, stop)
+    finally:
+        document_text.shutdown()
+        await llm_clients.aclose()
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
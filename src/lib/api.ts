@@ -14,6 +14,27 @@ const handleResponse = async (response: Response) => {
   return response.json();
 };
 
+// Helper function for list endpoints, which return one page at a time and
+// point to the next page with the X-Next-Cursor header
+const fetchAllPages = async (url: string, token: string) => {
+  const items: any[] = [];
+  let cursor: string | null = null;
+  do {
+    const separator = url.includes("?") ? "&" : "?";
+    const response = await fetch(
+      cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url,
+      {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      },
+    );
+    items.push(...(await handleResponse(response)));
+    cursor = response.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
+};
+
 // Authentication API
 export const authApi = {
   login: async (email: string, password: string) => {
@@ -45,13 +66,7 @@ export const authApi = {
 // Conversation API
 export const conversationApi = {
   getConversations: async (token: string) => {
-    const response = await fetch(`${API_URL}/conversations`, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
-
-    return handleResponse(response);
+    return fetchAllPages(`${API_URL}/conversations`, token);
   },
 
   createConversation: async (token: string, title: string) => {
@@ -68,16 +83,10 @@ export const conversationApi = {
   },
 
   getMessages: async (token: string, conversationId: string) => {
-    const response = await fetch(
+    return fetchAllPages(
       `${API_URL}/conversations/${conversationId}/messages`,
-      {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      },
+      token,
     );
-
-    return handleResponse(response);
   },
 
   sendMessage: async (
@@ -105,13 +114,7 @@ export const conversationApi = {
 // Document API (for RAG)
 export const documentApi = {
   getDocuments: async (token: string) => {
-    const response = await fetch(`${API_URL}/documents`, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
-
-    return handleResponse(response);
+    return fetchAllPages(`${API_URL}/documents`, token);
   },
 
   uploadDocument: async (